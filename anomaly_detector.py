@@ -1,18 +1,62 @@
 import re
+import time
+import bisect
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-import requests
 import json
+import requests
+from pattern_scanner import MATCH_CONTEXT_CHARS, TextMatch, build_scanner, get_scanner, match_priority, parse_number
+from match_resolver import resolve_overlaps
+from numeric_analysis import find_chronology_violations, find_numeric_discrepancies
+from date_normalizer import date_role_finder, normalize_date
+from keyword_index import clause_spans, get_clause_index
+from http_transport import get_transport
+from circuit_breaker import get_vllm_breaker
+from detectors import register_detector, run_detectors
+from llm_batcher import get_batcher
+from llm_cache import get_llm_cache
+from text_chunker import chunk_text, estimate_tokens
+from json_stream import JSONArrayStreamParser
+from shared_services import get_service
 
 logger = logging.getLogger(__name__)
 
-def detect_anomalies(text, config):
+# Distance from the end of a text window within which matches are not yet final
+RULE_WINDOW_MARGIN = 1024
+
+# Number matches analyzed together by the numeric discrepancy check
+NUMERIC_BATCH_SIZE = 4096
+
+# Number matches with a currency sign are amounts for the combined detector
+CURRENCY_PATTERN = re.compile(r'[$€£¥]')
+
+# Version of the prompt built by _build_prompt, part of the LLM response cache key
+PROMPT_VERSION = "1"
+
+# Sampling parameters of every anomaly detection request
+VLLM_SAMPLING = {"temperature": 0.3, "max_tokens": 1000}
+
+# Description of the anomaly reported in place of AI detection while vLLM is disabled
+AI_PLACEHOLDER_DESCRIPTION = 'Development mode: vLLM/Mistral 7B service not available. This is a placeholder anomaly.'
+
+def detect_anomalies(text, config, stats=None, names=None):
     """
-    Detect anomalies in the contract text using Mistral 7B through vLLM.
+    Detect anomalies in the contract text with all enabled detectors.
+    
+    The rule-based detector runs first; its match positions tell the AI
+    detector (Mistral 7B through vLLM) which chunks are worth sending to the
+    model. Other registered detectors run alongside them.
     
     Args:
         text (str): The text content of the document
         config (dict): Configuration settings
+        stats (dict): Optional dictionary that receives processing statistics
+            (chunks_skipped, tokens_saved, chunks_unanalyzed) and the timing
+            of each detector under 'detectors'
+        names (iterable): Only run the detectors with these names; all
+            enabled detectors by default
         
     Returns:
         list: List of anomalies detected
@@ -23,137 +67,365 @@ def detect_anomalies(text, config):
     
     logger.debug("Starting anomaly detection process")
     
-    anomalies = []
-    
-    # First, perform rule-based detection for simple cases
-    rule_based_anomalies = detect_rule_based_anomalies(text, config)
-    anomalies.extend(rule_based_anomalies)
-    
-    # Then, perform AI-based detection using Mistral 7B
-    ai_based_anomalies = detect_ai_based_anomalies(text, config)
-    anomalies.extend(ai_based_anomalies)
+    anomalies = run_detectors(text, config, stats, names)
     
     logger.info(f"Detected {len(anomalies)} anomalies in total")
     
     return anomalies
 
-def detect_rule_based_anomalies(text, config):
+def _rule_detector(text, config, inputs):
+    """Rule-based detector; also passes on the date and number match positions."""
+    match_positions = []
+    anomalies = detect_rule_based_anomalies(text, config, match_positions)
+    return {'anomalies': anomalies, 'matches': len(match_positions), 'match_positions': match_positions}
+
+def _chronology_detector(text, config, inputs):
+    """Chronology detector; its matches are the dates with a role."""
+    dates = []
+    anomalies = detect_chronology_anomalies(text, config, dates)
+    return {'anomalies': anomalies, 'matches': len(dates)}
+
+def _combined_detector(text, config, inputs):
+    """Combined detector; its matches are the tagged clause spans."""
+    spans = []
+    anomalies = detect_combined_anomalies(text, config, spans)
+    return {'anomalies': anomalies, 'matches': len(spans)}
+
+def _ai_detector(text, config, inputs):
+    """AI detector; uses the rule detector's match positions to skip chunks, if it ran."""
+    stats = {}
+    match_positions = inputs['rules']['match_positions'] if 'rules' in inputs else None
+    anomalies = detect_ai_based_anomalies(text, config, match_positions, stats)
+    return {'anomalies': anomalies, 'matches': stats.get('chunks_analyzed', 0), 'stats': stats}
+
+def detect_rule_based_anomalies(text, config, match_positions=None):
     """
     Detect anomalies using rule-based patterns.
     
     Args:
         text (str): The text content of the document
         config (dict): Configuration settings
+        match_positions (list): Optional list that receives the start
+            position of every date and number match
         
     Returns:
         list: List of anomalies detected using rules
     """
-    anomalies = []
+    # Date anomalies are reported before numeric ones
+    anomalies = sorted(iter_rule_based_anomalies(text, config, match_positions), key=lambda anomaly: anomaly['type'] != 'date')
     
-    # Date pattern anomalies
-    date_patterns = config["DATE_FORMAT_PATTERNS"]
-    dates = []
+    logger.debug(f"Detected {len(anomalies)} rule-based anomalies")
+    return anomalies
+
+def iter_rule_based_anomalies(text, config, match_positions=None):
+    """
+    Stream rule-based anomalies with memory bounded by the window size.
     
-    for pattern in date_patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            date_str = match.group(0)
-            start_pos = match.start()
-            end_pos = match.end()
-            context = text[max(0, start_pos - 50):min(len(text), end_pos + 50)]
-            
-            # Extract surrounding text for context
-            dates.append({
-                "date_str": date_str,
-                "start_position": start_pos,
-                "end_position": end_pos,
-                "context": context
-            })
+    The text is scanned window by window. Only the previous date match and
+    a batch of at most NUMERIC_BATCH_SIZE number matches are kept for
+    comparison, so memory does not grow with the size of the document.
+    Matches are assumed to be shorter than RULE_WINDOW_MARGIN characters.
     
-    # Check for date inconsistencies
-    if len(dates) > 1:
-        # Sort dates by position in text
-        dates.sort(key=lambda x: x["start_position"])
+    Args:
+        text (str or iterable): The text content of the document, or an
+            iterable of consecutive text windows
+        config (dict): Configuration settings
+        match_positions (list): Optional list that receives the start
+            position of every date and number match
         
-        # Check for potential date anomalies
-        for i in range(len(dates) - 1):
-            current_date = dates[i]["date_str"]
-            next_date = dates[i+1]["date_str"]
-            
-            # Simple heuristic: if dates are close together but different formats
-            # Consider it a potential anomaly
-            if dates[i+1]["start_position"] - dates[i]["end_position"] < 200:
-                # Different formats close to each other might be suspicious
-                if (current_date.count('/') and next_date.count('-')) or \
-                   (current_date.count('-') and next_date.count('/')):
-                    anomalies.append({
-                        'type': 'date',
-                        'severity': 'medium',
-                        'description': f'Inconsistent date formats: {current_date} and {next_date}',
-                        'context': f"...{dates[i]['context']}... and ...{dates[i+1]['context']}...",
-                        'start_position': dates[i]["start_position"],
-                        'end_position': dates[i+1]["end_position"]
-                    })
-    
-    # Numeric pattern anomalies
-    numeric_patterns = config["NUMERIC_PATTERNS"]
+    Yields:
+        dict: Each anomaly detected using rules, with positions relative
+            to the whole text; numeric anomalies are reported once their
+            batch of numbers is analyzed
+    """
+    windowed = not isinstance(text, str)
+    windows = text if windowed else [text]
+    scanner = get_scanner(config)
+    neighbours = config.get("NUMERIC_NEIGHBOURS", 1)
+    
+    buffer = ""
+    base = 0  # Text position of buffer[0]
+    resume = 0  # Text position the next scan starts from
+    previous_date = None
     numbers = []
+    compared = 0  # Leading entries of numbers already compared with each other
     
-    for pattern in numeric_patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            num_str = match.group(0)
-            start_pos = match.start()
-            end_pos = match.end()
-            context = text[max(0, start_pos - 50):min(len(text), end_pos + 50)]
+    windows = iter(windows)
+    final = False
+    while not final:
+        window = next(windows, None)
+        final = window is None
+        if not final:
+            buffer += window
+            if len(buffer) - (resume - base) < 2 * RULE_WINDOW_MARGIN:
+                continue
+        
+        # Only matches well inside the buffer are final; a match near its end may
+        # continue in the next window
+        limit = None if final else len(buffer) - RULE_WINDOW_MARGIN
+        progress = {}
+        candidates = _settled_candidates(scanner.candidates(buffer, resume - base), limit, progress)
+        
+        for start_pos, end_pos, match_type, _ in resolve_overlaps(candidates, match_priority):
+            if windowed:
+                # Pending matches hold only their context, not the whole window
+                context_start = max(0, start_pos - MATCH_CONTEXT_CHARS)
+                match = TextMatch(buffer[context_start:end_pos + MATCH_CONTEXT_CHARS], start_pos - context_start,
+                                  end_pos - context_start, match_type, base + context_start)
+            else:
+                match = TextMatch(buffer, start_pos, end_pos, match_type, base)
+            if match_positions is not None:
+                match_positions.append(match.start_position)
             
-            # Clean the number for comparison
-            clean_num = re.sub(r'[^\d.]', '', num_str)
-            if clean_num:
-                try:
-                    num_value = float(clean_num)
-                    numbers.append({
-                        "num_str": num_str,
-                        "num_value": num_value,
-                        "start_position": start_pos,
-                        "end_position": end_pos,
-                        "context": context
-                    })
-                except ValueError:
-                    pass  # Skip if conversion fails
-    
-    # Check for numeric anomalies
-    if len(numbers) > 1:
-        # Sort numbers by position in text
-        numbers.sort(key=lambda x: x["start_position"])
+            if match_type == 'date':
+                anomaly = _compare_dates(previous_date, match)
+                previous_date = match
+                if anomaly:
+                    yield anomaly
+            else:
+                match.num_value = parse_number(match.text)
+                if match.num_value is None:
+                    continue
+                numbers.append(match)
+                if len(numbers) - compared >= NUMERIC_BATCH_SIZE:
+                    yield from _numeric_anomalies(numbers, neighbours, compared)
+                    # The last numbers are still compared with those in the next batch
+                    numbers = numbers[max(0, len(numbers) - neighbours):]
+                    compared = len(numbers)
         
-        # Check for potential numeric anomalies (large discrepancies)
-        for i in range(len(numbers) - 1):
-            # If numbers are close in text but significantly different in value
-            if numbers[i+1]["start_position"] - numbers[i]["end_position"] < 200:
-                ratio = max(numbers[i]["num_value"], numbers[i+1]["num_value"]) / (
-                    min(numbers[i]["num_value"], numbers[i+1]["num_value"]) or 1)
-                
-                if ratio > 10 and min(numbers[i]["num_value"], numbers[i+1]["num_value"]) > 1:
-                    anomalies.append({
-                        'type': 'number',
-                        'severity': 'high',
-                        'description': f'Significant numeric discrepancy: {numbers[i]["num_str"]} and {numbers[i+1]["num_str"]}',
-                        'context': f"...{numbers[i]['context']}... and ...{numbers[i+1]['context']}...",
-                        'start_position': numbers[i]["start_position"],
-                        'end_position': numbers[i+1]["end_position"]
-                    })
+        if not final:
+            # Keep enough text before the resume point for context and word boundaries
+            resume = base + progress['cut']
+            keep_from = max(0, progress['cut'] - MATCH_CONTEXT_CHARS)
+            buffer = buffer[keep_from:]
+            base += keep_from
     
-    logger.debug(f"Detected {len(anomalies)} rule-based anomalies")
+    yield from _numeric_anomalies(numbers, neighbours, compared)
+
+def _settled_candidates(candidates, limit, progress):
+    """
+    Pass on scanner candidates whose overlap clusters lie before limit.
+    
+    Candidates starting before limit are complete, since no match reaches
+    past the end of the buffer. A cluster of overlapping candidates is only
+    passed on once it is known to be complete; progress['cut'] is set to a
+    position that no candidate spans, from which scanning can resume.
+    
+    Args:
+        candidates (iterator): Scanner candidates in order of start position
+        limit (int): Buffer position past which candidates may be incomplete,
+            or None if the buffer holds the rest of the text
+        progress (dict): Receives the resume position as 'cut'
+        
+    Yields:
+        tuple: The candidates before the cut
+    """
+    cluster = []
+    reach = 0
+    for candidate in candidates:
+        start, end = candidate[0], candidate[1]
+        if limit is not None and start >= limit:
+            if reach <= limit:
+                yield from cluster
+                progress['cut'] = limit
+            else:
+                # The last cluster reaches past the limit; rescan it with more text
+                progress['cut'] = cluster[0][0]
+            return
+        if start >= reach:
+            yield from cluster
+            cluster = []
+        cluster.append(candidate)
+        reach = max(reach, end)
+    
+    if limit is None or reach <= limit:
+        yield from cluster
+        progress['cut'] = limit
+    else:
+        progress['cut'] = cluster[0][0]
+
+def detect_chronology_anomalies(text, config, dates=None):
+    """
+    Detect related dates in the wrong order, such as an end date before its start date.
+    
+    Each date is parsed in the format of the pattern that matched it and
+    takes its role (e.g. 'start', 'due') from the last DATE_ROLE_KEYWORDS
+    keyword in the text since the previous date, looking back at most
+    MATCH_CONTEXT_CHARS characters. For each CHRONOLOGY_RULES pair of
+    roles, every date of the later role is checked against the nearest
+    date of the earlier role.
+    
+    Args:
+        text (str): The text content of the document
+        config (dict): Configuration settings
+        dates (list): Optional list that receives a TextMatch for every
+            parsed date with a role
+        
+    Returns:
+        list: Anomalies for dates out of order, in text order
+    """
+    find_role = date_role_finder(config)
+    scanner = build_scanner(tuple(config["DATE_FORMAT_PATTERNS"]), ())
+    
+    by_role = {}
+    previous_end = 0
+    for start_pos, end_pos, _, pattern_index in scanner.scan(text):
+        role = find_role(text[max(previous_end, start_pos - MATCH_CONTEXT_CHARS):start_pos])
+        previous_end = end_pos
+        if role is None:
+            continue
+        match = TextMatch(text, start_pos, end_pos, 'date')
+        parsed = normalize_date(match.text, pattern_index, config)
+        if parsed is None:
+            continue
+        by_role.setdefault(role, []).append((match, parsed.toordinal()))
+        if dates is not None:
+            dates.append(match)
+    
+    anomalies = []
+    for earlier_role, later_role, description in config.get("CHRONOLOGY_RULES", []):
+        earlier = by_role.get(earlier_role, [])
+        later = by_role.get(later_role, [])
+        firsts, seconds = find_chronology_violations(
+            [match.start_position for match, _ in earlier],
+            [day for _, day in earlier],
+            [match.start_position for match, _ in later],
+            [day for _, day in later]
+        )
+        for first, second in zip(firsts.tolist(), seconds.tolist()):
+            earlier_date = earlier[first][0]
+            later_date = later[second][0]
+            anomalies.append({
+                'type': 'date',
+                'severity': 'high',
+                'description': f'{description}: {later_date.text} is before {earlier_date.text}',
+                'context': f"...{earlier_date.context}... and ...{later_date.context}...",
+                'start_position': min(earlier_date.start_position, later_date.start_position),
+                'end_position': max(earlier_date.end_position, later_date.end_position)
+            })
+    
+    anomalies.sort(key=lambda anomaly: anomaly['start_position'])
+    logger.debug(f"Detected {len(anomalies)} chronology anomalies")
     return anomalies
 
-def detect_ai_based_anomalies(text, config):
+def detect_combined_anomalies(text, config, spans=None):
+    """
+    Detect clauses of the same type that give different amounts for the same date.
+    
+    Clauses are tagged with their types (payment, penalty, ...) in one pass
+    of the CLAUSE_KEYWORDS automaton. A clause with exactly one date and one
+    currency amount pairs the two; when two clauses of the same type pair
+    the same date with different amounts, they conflict.
+    
+    Args:
+        text (str): The text content of the document
+        config (dict): Configuration settings
+        spans (list): Optional list that receives the (start, end,
+            clause_type) of every tagged clause
+        
+    Returns:
+        list: Combined anomalies, in text order
+    """
+    tagged = clause_spans(text, get_clause_index(config))
+    if spans is not None:
+        spans.extend(tagged)
+    scanner = get_scanner(config)
+    
+    anomalies = []
+    pairs = {}  # (clause type, day) -> (amount match, date match) of the first clause
+    for span_start, span_end, clause_type in tagged:
+        dates = []
+        amounts = []
+        for start_pos, end_pos, match_type, pattern_index in scanner.scan(text[span_start:span_end]):
+            match = TextMatch(text, span_start + start_pos, span_start + end_pos, match_type)
+            if match_type == 'date':
+                parsed = normalize_date(match.text, pattern_index, config)
+                if parsed is not None:
+                    dates.append((match, parsed.toordinal()))
+            elif CURRENCY_PATTERN.search(match.text):
+                match.num_value = parse_number(match.text)
+                if match.num_value is not None:
+                    amounts.append(match)
+        if len(dates) != 1 or len(amounts) != 1:
+            continue
+        
+        (date, day), amount = dates[0], amounts[0]
+        first_amount, first_date = pairs.setdefault((clause_type, day), (amount, date))
+        if first_amount.num_value != amount.num_value:
+            anomalies.append({
+                'type': 'combined',
+                'severity': 'high',
+                'description': (f'Conflicting {clause_type} amounts for the same date: {first_amount.text} on '
+                                f'{first_date.text} and {amount.text} on {date.text}'),
+                'context': f"...{first_amount.context}... and ...{amount.context}...",
+                'start_position': min(first_amount.start_position, first_date.start_position),
+                'end_position': max(amount.end_position, date.end_position)
+            })
+    
+    logger.debug(f"Detected {len(anomalies)} combined anomalies in {len(tagged)} clauses")
+    return anomalies
+
+def _compare_dates(previous, current):
+    """Return an anomaly if two neighbouring dates use different formats."""
+    if previous is None:
+        return None
+    
+    current_date = previous.text
+    next_date = current.text
+    
+    # Simple heuristic: if dates are close together but different formats
+    # Consider it a potential anomaly
+    if current.start_position - previous.end_position < 200:
+        # Different formats close to each other might be suspicious
+        if (current_date.count('/') and next_date.count('-')) or \
+           (current_date.count('-') and next_date.count('/')):
+            return {
+                'type': 'date',
+                'severity': 'medium',
+                'description': f'Inconsistent date formats: {current_date} and {next_date}',
+                'context': f"...{previous.context}... and ...{current.context}...",
+                'start_position': previous.start_position,
+                'end_position': current.end_position
+            }
+    return None
+
+def _numeric_anomalies(numbers, neighbours, skip):
+    """Return anomalies for nearby numbers that differ by an order of magnitude."""
+    firsts, seconds = find_numeric_discrepancies(
+        [number.start_position for number in numbers],
+        [number.end_position for number in numbers],
+        [number.num_value for number in numbers],
+        neighbours,
+        skip
+    )
+    
+    anomalies = []
+    for first, second in zip(firsts.tolist(), seconds.tolist()):
+        previous = numbers[first]
+        current = numbers[second]
+        anomalies.append({
+            'type': 'number',
+            'severity': 'high',
+            'description': f'Significant numeric discrepancy: {previous.text} and {current.text}',
+            'context': f"...{previous.context}... and ...{current.context}...",
+            'start_position': previous.start_position,
+            'end_position': current.end_position
+        })
+    return anomalies
+
+def detect_ai_based_anomalies(text, config, match_positions=None, stats=None):
     """
     Detect anomalies using Mistral 7B served by vLLM.
     
     Args:
         text (str): The text content of the document
         config (dict): Configuration settings
+        match_positions (list): Sorted start positions of the rule-based date
+            and number matches, used to skip chunks without any; the text is
+            scanned for them if not given
+        stats (dict): Optional dictionary that receives processing statistics,
+            including chunks_analyzed and chunks_unanalyzed for chunks the
+            model did and did not answer
         
     Returns:
         list: List of anomalies detected using AI
@@ -168,27 +440,142 @@ def detect_ai_based_anomalies(text, config):
         anomalies.append({
             'type': 'combined',
             'severity': 'medium',
-            'description': 'Development mode: vLLM/Mistral 7B service not available. This is a placeholder anomaly.',
+            'description': AI_PLACEHOLDER_DESCRIPTION,
             'context': 'This anomaly was generated in development mode as vLLM/Mistral 7B was not available. Configure the VLLM_ENABLED setting to use AI-based detection.',
             'start_position': 0,
             'end_position': min(100, len(text)) if text else 0
         })
         return anomalies
     
-    # If text is too long, split it into chunks
-    max_chunk_size = 8000  # Limit chunk size for model input
-    chunks = [text[i:i+max_chunk_size] for i in range(0, len(text), max_chunk_size)]
+    # Split the text on clause boundaries into chunks that fit the model's
+    # token budget, overlapping so anomalies at a boundary are not cut in half
+    chunks = chunk_text(text, config.get("AI_CHUNK_MAX_TOKENS", 3000), config.get("AI_CHUNK_OVERLAP_TOKENS", 0))
     
     logger.debug(f"Split document into {len(chunks)} chunks for AI analysis")
     
     vllm_url = f"http://{config['VLLM_HOST']}:{config['VLLM_PORT']}/generate"
     
-    for i, chunk in enumerate(chunks):
-        # Skip very small chunks
-        if len(chunk) < 100:
-            continue
-            
-        prompt = f"""
+    # Skip very small chunks
+    jobs = [(i, chunk['text'], chunk['start_offset']) for i, chunk in enumerate(chunks) if len(chunk['text']) >= 100]
+    
+    if config.get("AI_PREFILTER_ENABLED", False):
+        jobs = _prefilter_chunks(text, jobs, match_positions, config, stats)
+    
+    # All chunks share one time budget, so an unresponsive model cannot hold
+    # the document for a full request timeout per chunk
+    deadline = time.monotonic() + config.get("AI_DOCUMENT_BUDGET_SECONDS", 60)
+    
+    def analyze(job):
+        i, chunk, chunk_offset = job
+        return _analyze_chunk(i, chunk, chunk_offset, vllm_url, deadline, config)
+    
+    # Chunks are sent concurrently so vLLM can batch them; map() keeps chunk order
+    concurrency = min(config.get("VLLM_CONCURRENCY_PER_DOCUMENT", 1), len(jobs))
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="vllm-chunk") as executor:
+            results = list(executor.map(analyze, jobs))
+    else:
+        results = [analyze(job) for job in jobs]
+    
+    unanalyzed = sum(result is None for result in results)
+    if unanalyzed:
+        logger.warning(f"AI detection skipped {unanalyzed} of {len(jobs)} chunks; results are partial")
+    if stats is not None:
+        stats['chunks_analyzed'] = stats.get('chunks_analyzed', 0) + len(jobs) - unanalyzed
+        stats['chunks_unanalyzed'] = stats.get('chunks_unanalyzed', 0) + unanalyzed
+    
+    anomalies.extend(_merge_chunk_anomalies(text, jobs, [result or [] for result in results]))
+    
+    logger.debug(f"Detected {len(anomalies)} AI-based anomalies")
+    return anomalies
+
+def _prefilter_chunks(text, jobs, match_positions, config, stats):
+    """
+    Drop chunks with too few dates and amounts to be worth sending to the model.
+    
+    A chunk is kept if it has at least AI_PREFILTER_MIN_DENSITY rule-based
+    matches per 1,000 estimated tokens.
+    
+    Args:
+        text (str): The text content of the document
+        jobs (list): (index, chunk text, chunk offset) of each chunk
+        match_positions (list): Sorted start positions of date and number
+            matches, or None to scan the text for them
+        config (dict): Configuration settings
+        stats (dict): Optional dictionary that receives chunks_skipped and
+            tokens_saved
+        
+    Returns:
+        list: The jobs to send to the model
+    """
+    if match_positions is None:
+        match_positions = [start for start, _, _, _ in get_scanner(config).scan(text)]
+    min_density = config.get("AI_PREFILTER_MIN_DENSITY", 1.0)
+    
+    kept = []
+    chunks_skipped = 0
+    tokens_saved = 0
+    for job in jobs:
+        _, chunk, chunk_offset = job
+        matches = (bisect.bisect_left(match_positions, chunk_offset + len(chunk))
+                   - bisect.bisect_left(match_positions, chunk_offset))
+        if matches * 1000 >= min_density * estimate_tokens(chunk):
+            kept.append(job)
+        else:
+            chunks_skipped += 1
+            tokens_saved += estimate_tokens(_build_prompt(chunk))
+    
+    if chunks_skipped:
+        logger.debug(f"Prefilter skipped {chunks_skipped} of {len(jobs)} chunks, saving about {tokens_saved} tokens")
+    if stats is not None:
+        stats['chunks_skipped'] = stats.get('chunks_skipped', 0) + chunks_skipped
+        stats['tokens_saved'] = stats.get('tokens_saved', 0) + tokens_saved
+    return kept
+
+def _merge_chunk_anomalies(text, jobs, results):
+    """
+    Combine per-chunk anomalies in chunk order, dropping overlap duplicates.
+    
+    An anomaly is dropped when the previous chunk reported one of the same
+    type with the same context (or description, if there is no context) and
+    that context lies in the text the two chunks share.
+    
+    Args:
+        text (str): The text content of the document
+        jobs (list): (index, chunk text, chunk offset) of each analyzed chunk
+        results (list): Anomalies found in each chunk
+        
+    Returns:
+        list: The merged anomalies
+    """
+    anomalies = []
+    previous_keys = set()
+    previous_end = 0
+    for (_, chunk, chunk_offset), chunk_anomalies in zip(jobs, results):
+        overlap = _normalize_snippet(text[chunk_offset:previous_end]) if previous_end > chunk_offset else ""
+        keys = set()
+        for anomaly in chunk_anomalies:
+            key = _anomaly_key(anomaly)
+            keys.add(key)
+            if overlap and key in previous_keys and (not key[1] or key[1] in overlap):
+                continue
+            anomalies.append(anomaly)
+        previous_keys = keys
+        previous_end = chunk_offset + len(chunk)
+    return anomalies
+
+def _anomaly_key(anomaly):
+    """Return (type, context, description) used to recognise a repeated anomaly."""
+    context = _normalize_snippet(anomaly.get('context', ''))
+    description = "" if context else _normalize_snippet(anomaly.get('description', ''))
+    return anomaly.get('type'), context, description
+
+def _normalize_snippet(snippet):
+    return " ".join(str(snippet).lower().split())
+
+def _build_prompt(chunk):
+    """Return the anomaly detection prompt for a chunk of contract text; bump PROMPT_VERSION when changing it."""
+    return f"""
 You are an AI specialized in legal document analysis. Carefully examine the following contract text for anomalies, focusing specifically on:
 
 1. Date inconsistencies or unusual dates
@@ -209,62 +596,187 @@ Contract text:
 Return ONLY the JSON array. If no anomalies are found, return an empty JSON array [].
 """
 
-        try:
-            # Call the vLLM API to get Mistral 7B response
-            payload = {
-                "prompt": prompt,
-                "temperature": 0.3,
-                "max_tokens": 1000,
-                "stop": None
-            }
+def _analyze_chunk(i, chunk, chunk_offset, vllm_url, deadline, config):
+    """
+    Find the anomalies in one chunk, from the response cache or from vLLM.
+    
+    The model is not asked once the document's time budget is used up or
+    while the vLLM circuit breaker is open.
+    
+    Args:
+        i (int): Index of the chunk in the document
+        chunk (str): Text of the chunk
+        chunk_offset (int): Position of the chunk in the document text
+        vllm_url (str): URL of the vLLM generate endpoint
+        deadline (float): time.monotonic() value by which the document's AI
+            detection must finish
+        config (dict): Configuration settings
+        
+    Returns:
+        list: Anomalies found in the chunk, with document positions, or None
+            if the chunk could not be analyzed
+    """
+    anomalies = []
+    try:
+        cache = get_llm_cache(config)
+        chunk_anomalies = None
+        if cache:
+            cache_key = cache.key_for(chunk, PROMPT_VERSION, config["MODEL_NAME"], VLLM_SAMPLING)
+            chunk_anomalies = cache.get(cache_key)
+        
+        if chunk_anomalies is None:
+            if time.monotonic() >= deadline:
+                logger.warning(f"AI time budget used up; skipping chunk {i}")
+                return None
+            breaker = get_vllm_breaker(config)
+            if not breaker.allow():
+                logger.debug(f"vLLM circuit breaker is open; skipping chunk {i}")
+                return None
             
-            response = requests.post(vllm_url, json=payload, timeout=10)
+            try:
+                chunk_anomalies, complete = _query_model(i, chunk, vllm_url, deadline, config)
+            except Exception as e:
+                # A request cut short by this document's time budget says nothing
+                # about the health of vLLM, which other documents share
+                if _is_service_failure(e) and time.monotonic() < deadline:
+                    breaker.record_failure()
+                else:
+                    breaker.record_inconclusive()
+                raise
+            breaker.record_success()
             
-            if response.status_code == 200:
-                result = response.json()
-                generated_text = result.get("text", "")
-                
-                # Extract JSON array from the response
-                try:
-                    # Find JSON array in the response
-                    json_start = generated_text.find('[')
-                    json_end = generated_text.rfind(']') + 1
-                    
-                    if json_start >= 0 and json_end > json_start:
-                        json_str = generated_text[json_start:json_end]
-                        chunk_anomalies = json.loads(json_str)
-                        
-                        # Add offset to any positions if we're processing chunks
-                        chunk_offset = i * max_chunk_size
-                        for anomaly in chunk_anomalies:
-                            # Add chunk offset to the anomaly position if it exists
-                            if 'start_position' in anomaly:
-                                anomaly['start_position'] += chunk_offset
-                            if 'end_position' in anomaly:
-                                anomaly['end_position'] += chunk_offset
-                                
-                            anomalies.append(anomaly)
-                    else:
-                        logger.warning(f"No valid JSON found in response for chunk {i}")
-                        
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse JSON from model response: {e}")
-                    logger.debug(f"Raw response: {generated_text}")
-            else:
-                logger.error(f"vLLM API request failed with status code {response.status_code}")
-                logger.debug(f"Response: {response.text}")
+            # Only complete answers are cached, so failed requests are retried next time
+            if cache and complete:
+                cache.put(cache_key, chunk_anomalies)
+        
+        for anomaly in chunk_anomalies or []:
+            # Add chunk offset to the anomaly position if it exists
+            if 'start_position' in anomaly:
+                anomaly['start_position'] += chunk_offset
+            if 'end_position' in anomaly:
+                anomaly['end_position'] += chunk_offset
                 
-        except Exception as e:
-            logger.error(f"Error during AI anomaly detection: {str(e)}", exc_info=True)
-            # Add a fallback anomaly when the service is unavailable
-            anomalies.append({
-                'type': 'combined',
-                'severity': 'low',
-                'description': f'Error connecting to vLLM/Mistral 7B service: {str(e)}',
-                'context': 'There was an error connecting to the AI service. This is a placeholder anomaly.',
-                'start_position': 0,
-                'end_position': min(100, len(text)) if text else 0
-            })
+            anomalies.append(anomaly)
+            
+    except Exception as e:
+        logger.error(f"Error during AI anomaly detection of chunk {i}: {str(e)}", exc_info=True)
+        return None
     
-    logger.debug(f"Detected {len(anomalies)} AI-based anomalies")
     return anomalies
+
+def _is_service_failure(error):
+    """Return True if a model request failed because vLLM was unreachable, too slow or broken."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, FutureTimeoutError)):
+        return True
+    return isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code >= 500
+
+def _query_model(i, chunk, vllm_url, deadline, config):
+    """
+    Ask the model for the anomalies in a chunk.
+    
+    The answer is parsed incrementally, so each well-formed anomaly object
+    is kept even if others are malformed or the output is cut off.
+    
+    Args:
+        i (int): Index of the chunk in the document
+        chunk (str): Text of the chunk
+        vllm_url (str): URL of the vLLM generate endpoint
+        deadline (float): time.monotonic() value after which the request
+            is given up
+        config (dict): Configuration settings
+        
+    Returns:
+        tuple: (anomalies, complete) where anomalies have positions relative
+            to the chunk, and complete is True if the model returned a
+            whole JSON array
+    """
+    parser = JSONArrayStreamParser()
+    anomalies = []
+    
+    if config.get("VLLM_BATCHING_ENABLED", False):
+        # Share a multi-prompt request with chunks of other documents
+        timeout = min(config.get("VLLM_REQUEST_TIMEOUT", 10), deadline - time.monotonic())
+        generated_text = get_batcher(config).complete(_build_prompt(chunk), timeout=timeout, **VLLM_SAMPLING)
+        anomalies.extend(parser.feed(generated_text))
+    elif config.get("VLLM_STREAMING_ENABLED", False):
+        stream = _stream_completion(_build_prompt(chunk), deadline, config)
+        try:
+            for piece in stream:
+                anomalies.extend(parser.feed(piece))
+                if parser.done:
+                    # Closing the stream once the array ends stops the generation
+                    break
+                if time.monotonic() >= deadline:
+                    logger.warning(f"AI time budget used up while streaming chunk {i}")
+                    break
+        finally:
+            stream.close()
+    else:
+        # Call the vLLM API to get Mistral 7B response
+        payload = dict(VLLM_SAMPLING, prompt=_build_prompt(chunk), stop=None)
+        
+        with _get_vllm_semaphore(config):
+            response = get_transport(config).post(vllm_url, json=payload, idempotent=True, deadline=deadline,
+                                                  timeout=config.get("VLLM_REQUEST_TIMEOUT", 10))
+        
+        if response.status_code != 200:
+            logger.debug(f"Response: {response.text}")
+            raise requests.HTTPError(f"vLLM API request failed with status code {response.status_code}", response=response)
+        
+        result = response.json()
+        generated_text = result.get("text", "")
+        anomalies.extend(parser.feed(generated_text))
+    
+    if not parser.started:
+        logger.warning(f"No valid JSON found in response for chunk {i}")
+    elif not parser.done:
+        logger.warning(f"Model response for chunk {i} ended inside the JSON array; kept {len(anomalies)} anomalies")
+    
+    return anomalies, parser.done and not parser.skipped
+
+def _stream_completion(prompt, deadline, config):
+    """
+    Stream a completion from vLLM's OpenAI-compatible endpoint.
+    
+    Args:
+        prompt (str): Prompt to complete
+        deadline (float): time.monotonic() value after which the request is
+            not retried
+        config (dict): Configuration settings
+        
+    Yields:
+        str: Pieces of generated text as they arrive
+    """
+    url = f"http://{config['VLLM_HOST']}:{config['VLLM_PORT']}/v1/completions"
+    payload = dict(VLLM_SAMPLING, model=config["MODEL_NAME"], prompt=prompt, stream=True)
+    
+    with _get_vllm_semaphore(config):
+        response = get_transport(config).post(url, json=payload, stream=True, idempotent=True, deadline=deadline,
+                                              timeout=config.get("VLLM_REQUEST_TIMEOUT", 10))
+        try:
+            if response.status_code != 200:
+                logger.debug(f"Response: {response.text}")
+                raise requests.HTTPError(f"vLLM streaming request failed with status code {response.status_code}",
+                                         response=response)
+            
+            # Server-sent events: "data: {...}" lines, ending with "data: [DONE]"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                if choices:
+                    yield choices[0].get("text", "")
+        finally:
+            response.close()
+
+def _get_vllm_semaphore(config):
+    """Return the semaphore limiting concurrent vLLM requests in this process."""
+    return get_service('vllm_semaphore', lambda: threading.BoundedSemaphore(config.get("VLLM_MAX_CONCURRENT_REQUESTS", 8)))
+
+register_detector('rules', 'cpu', _rule_detector)
+register_detector('chronology', 'cpu', _chronology_detector)
+register_detector('combined', 'cpu', _combined_detector, scope='document')
+register_detector('ai', 'io', _ai_detector, after=('rules',))
@@ -2,6 +2,7 @@ import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import DeclarativeBase
 
 # Set up logging
@@ -29,11 +30,31 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 # Initialize the app with the database extension
 db.init_app(app)
 
+def add_missing_columns():
+    """
+    Add model columns missing from existing tables.
+    
+    create_all() only creates missing tables, so databases created by an
+    earlier version lack the columns added since. Those columns are all
+    nullable and are added empty; running this again changes nothing.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                logger.info(f"Added column {table.name}.{column.name} to the database")
+
 # Create all tables
 with app.app_context():
     # Import models here to avoid circular imports
     import models  # noqa: F401
     db.create_all()
+    add_missing_columns()
     logger.debug("Database tables created")
 
 # Load configuration
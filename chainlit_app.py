@@ -5,9 +5,10 @@ import chainlit as cl
 from chainlit.types import AskFileResponse
 from chainlit.element import Element
 import tempfile
-import requests
 import json
 from typing import List, Dict, Any
+from config import load_config
+from http_transport import get_transport
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +19,9 @@ FLASK_HOST = os.environ.get("FLASK_HOST", "localhost")
 FLASK_PORT = os.environ.get("FLASK_PORT", "5000")
 API_BASE_URL = f"http://{FLASK_HOST}:{FLASK_PORT}"
 
+# Keep-alive connections to the backend, shared by all chat sessions
+transport = get_transport(load_config())
+
 # File upload settings
 ALLOWED_EXTENSIONS = {"pdf", "docx", "txt", "doc", "rtf"}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16 MB
@@ -36,7 +40,7 @@ async def upload_file_to_flask(file_path: str, filename: str) -> Dict[str, Any]:
     try:
         with open(file_path, 'rb') as f:
             files = {'file': (filename, f)}
-            response = requests.post(f"{API_BASE_URL}/upload", files=files)
+            response = transport.post(f"{API_BASE_URL}/upload", files=files)
             
             if response.status_code == 200:
                 return {"success": True, "message": "File uploaded successfully"}
@@ -49,7 +53,7 @@ async def upload_file_to_flask(file_path: str, filename: str) -> Dict[str, Any]:
 async def fetch_document_status(document_id: int) -> Dict[str, Any]:
     """Fetch document processing status from Flask backend."""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/document/{document_id}/status")
+        response = transport.get(f"{API_BASE_URL}/api/document/{document_id}/status")
         if response.status_code == 200:
             return response.json()
         else:
@@ -61,7 +65,7 @@ async def fetch_document_status(document_id: int) -> Dict[str, Any]:
 async def fetch_document_anomalies(document_id: int) -> List[Dict[str, Any]]:
     """Fetch document anomalies from Flask backend."""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/document/{document_id}/anomalies")
+        response = transport.get(f"{API_BASE_URL}/api/document/{document_id}/anomalies")
         if response.status_code == 200:
             return response.json()
         else:
@@ -73,7 +77,7 @@ async def fetch_document_anomalies(document_id: int) -> List[Dict[str, Any]]:
 async def search_documents(query: str) -> List[Dict[str, Any]]:
     """Search documents in the backend."""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/search", params={"q": query, "limit": 5})
+        response = transport.get(f"{API_BASE_URL}/api/search", params={"q": query, "limit": 5})
         if response.status_code == 200:
             return response.json()
         else:
@@ -190,7 +194,10 @@ async def on_message(message: cl.Message):
             anomalies = await fetch_document_anomalies(doc_id)
             
             response = f"## Document: {status.get('filename', f'Document {doc_id}')}\n\n"
-            response += f"**Status:** Processed\n"
+            if status.get("job_status") == "partial":
+                response += f"**Status:** Partially processed ({status.get('error')})\n"
+            else:
+                response += f"**Status:** Processed\n"
             response += f"**Anomalies detected:** {len(anomalies)}\n\n"
             
             if anomalies:
@@ -0,0 +1,112 @@
+import time
+import logging
+import threading
+from shared_services import get_service
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by all callers of one remote service.
+
+    The breaker is closed while the service works. After failure_threshold
+    consecutive failures it opens, and requests are refused without
+    contacting the service. Once reset_timeout seconds have passed, a
+    single trial request is let through (half-open): its success closes
+    the breaker again, its failure reopens it for another reset_timeout.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        """
+        Check whether a request may be sent to the service now.
+
+        Returns:
+            bool: True if the request may go ahead; the caller must then
+                report its outcome with record_success or record_failure
+        """
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+                logger.info(f"Circuit breaker for {self.name} is half-open; sending a trial request")
+
+            if self.state == self.HALF_OPEN:
+                if self.trial_in_flight:
+                    self.rejected += 1
+                    return False
+                self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        """Report a successful request."""
+        with self.lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit breaker for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        """Report a failed request."""
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+                self.times_opened += 1
+                logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} consecutive failures")
+
+    def record_inconclusive(self):
+        """Report a request whose outcome says nothing about the service's health."""
+        with self.lock:
+            # Let another trial through if this one was the half-open trial
+            self.trial_in_flight = False
+
+    def stats(self):
+        """Return the breaker's state and counters."""
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout
+            }
+
+def get_vllm_breaker(config):
+    """
+    Return the process-wide circuit breaker around the vLLM server.
+
+    Args:
+        config (dict): Configuration settings
+
+    Returns:
+        CircuitBreaker: The shared breaker
+    """
+    return get_service('vllm_breaker', lambda: CircuitBreaker(
+        "vLLM",
+        failure_threshold=config["VLLM_BREAKER_FAILURE_THRESHOLD"],
+        reset_timeout=config["VLLM_BREAKER_RESET_SECONDS"]
+    ))
@@ -10,6 +10,22 @@ def load_config():
         "UPLOAD_FOLDER": os.environ.get("UPLOAD_FOLDER", "/tmp/contract_uploads"),
         "ALLOWED_EXTENSIONS": {"pdf", "docx", "txt", "doc", "rtf"},
         "MAX_CONTENT_LENGTH": 16 * 1024 * 1024,  # 16 MB max file size
+        "PDF_PARALLEL_PAGE_THRESHOLD": int(os.environ.get("PDF_PARALLEL_PAGE_THRESHOLD", 50)),  # Pages before using the pool
+        "PDF_PARALLEL_WORKERS": int(os.environ.get("PDF_PARALLEL_WORKERS", os.cpu_count() or 1)),
+        "DOCX_BACKEND": os.environ.get("DOCX_BACKEND", "stream"),  # stream or python-docx
+        "TXT_MMAP_ENABLED": os.environ.get("TXT_MMAP_ENABLED", "true").lower() == "true",
+        "TXT_WINDOW_SIZE": int(os.environ.get("TXT_WINDOW_SIZE", 1024 * 1024)),  # Bytes decoded per window
+        
+        # Parser Sandbox (parse each document in a resource-limited worker process)
+        "PARSER_SANDBOX_ENABLED": os.environ.get("PARSER_SANDBOX_ENABLED", "false").lower() == "true",
+        "PARSER_SANDBOX_CPU_SECONDS": int(os.environ.get("PARSER_SANDBOX_CPU_SECONDS", 60)),
+        "PARSER_SANDBOX_MAX_RSS_MB": int(os.environ.get("PARSER_SANDBOX_MAX_RSS_MB", 512)),
+        "PARSER_SANDBOX_TIMEOUT": int(os.environ.get("PARSER_SANDBOX_TIMEOUT", 120)),  # Wall-clock seconds
+        
+        # Extraction Cache
+        "EXTRACTION_CACHE_ENABLED": os.environ.get("EXTRACTION_CACHE_ENABLED", "true").lower() == "true",
+        "EXTRACTION_CACHE_DIR": os.environ.get("EXTRACTION_CACHE_DIR", "/tmp/contract_extraction_cache"),
+        "EXTRACTION_CACHE_MAX_BYTES": int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", 256 * 1024 * 1024)),  # 256 MB
         
         # Development or Production mode
         "DEV_MODE": os.environ.get("DEV_MODE", "true").lower() == "true",
@@ -19,6 +35,32 @@ def load_config():
         "VLLM_HOST": os.environ.get("VLLM_HOST", "localhost"),
         "VLLM_PORT": int(os.environ.get("VLLM_PORT", 8000)),
         "MODEL_NAME": os.environ.get("MODEL_NAME", "mistralai/Mistral-7B-Instruct-v0.2"),
+        "AI_CHUNK_MAX_TOKENS": int(os.environ.get("AI_CHUNK_MAX_TOKENS", 3000)),  # Contract text per request, excluding the prompt
+        "AI_CHUNK_OVERLAP_TOKENS": int(os.environ.get("AI_CHUNK_OVERLAP_TOKENS", 150)),  # Repeated at the start of the next chunk
+        "AI_PREFILTER_ENABLED": os.environ.get("AI_PREFILTER_ENABLED", "true").lower() == "true",  # Skip chunks without dates or amounts
+        "AI_PREFILTER_MIN_DENSITY": float(os.environ.get("AI_PREFILTER_MIN_DENSITY", 1.0)),  # Date/number matches per 1,000 tokens
+        "VLLM_CONCURRENCY_PER_DOCUMENT": int(os.environ.get("VLLM_CONCURRENCY_PER_DOCUMENT", 4)),  # Chunks in flight per document
+        "VLLM_MAX_CONCURRENT_REQUESTS": int(os.environ.get("VLLM_MAX_CONCURRENT_REQUESTS", 8)),  # Requests in flight per process
+        "VLLM_BATCHING_ENABLED": os.environ.get("VLLM_BATCHING_ENABLED", "false").lower() == "true",  # Needs the /v1/completions API
+        "VLLM_BATCH_MAX_SIZE": int(os.environ.get("VLLM_BATCH_MAX_SIZE", 16)),  # Prompts per batched request
+        "VLLM_BATCH_MAX_WAIT_MS": int(os.environ.get("VLLM_BATCH_MAX_WAIT_MS", 20)),  # Wait for more prompts before flushing
+        "VLLM_BATCH_TIMEOUT": float(os.environ.get("VLLM_BATCH_TIMEOUT", 30)),  # Seconds per batched request
+        "VLLM_STREAMING_ENABLED": os.environ.get("VLLM_STREAMING_ENABLED", "false").lower() == "true",  # Stream unbatched requests over /v1/completions
+        "VLLM_REQUEST_TIMEOUT": float(os.environ.get("VLLM_REQUEST_TIMEOUT", 10)),  # Seconds per request
+        "VLLM_BREAKER_FAILURE_THRESHOLD": int(os.environ.get("VLLM_BREAKER_FAILURE_THRESHOLD", 3)),  # Consecutive failures before skipping vLLM
+        "VLLM_BREAKER_RESET_SECONDS": float(os.environ.get("VLLM_BREAKER_RESET_SECONDS", 30)),  # Wait before a trial request
+        "AI_DOCUMENT_BUDGET_SECONDS": float(os.environ.get("AI_DOCUMENT_BUDGET_SECONDS", 60)),  # AI detection time per document
+        
+        # LLM Response Cache (anomalies returned per chunk, keyed by chunk content)
+        "LLM_CACHE_ENABLED": os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true",
+        "LLM_CACHE_PATH": os.environ.get("LLM_CACHE_PATH", "/tmp/contract_llm_cache.sqlite3"),
+        "LLM_CACHE_MAX_BYTES": int(os.environ.get("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024)),  # 64 MB
+        
+        # Outbound HTTP (model server and backend API)
+        "HTTP_POOL_MAXSIZE": int(os.environ.get("HTTP_POOL_MAXSIZE", 16)),  # Keep-alive connections per host
+        "HTTP_MAX_RETRIES": int(os.environ.get("HTTP_MAX_RETRIES", 2)),  # Extra attempts for idempotent requests
+        "HTTP_BACKOFF_BASE": float(os.environ.get("HTTP_BACKOFF_BASE", 0.25)),  # Seconds, doubled per attempt
+        "HTTP_BACKOFF_MAX": float(os.environ.get("HTTP_BACKOFF_MAX", 4.0)),  # Cap on a single backoff, in seconds
         
         # Weaviate Configuration
         "WEAVIATE_ENABLED": os.environ.get("WEAVIATE_ENABLED", "false").lower() == "true",
@@ -39,6 +81,33 @@ def load_config():
             r'\d{1,2}\s+(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{4}',
             r'(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},\s+\d{4}'
         ],
+        "DATE_PATTERN_FORMATS": [  # strptime format of each DATE_FORMAT_PATTERNS entry, in the same order
+            "%m/%d/%Y",
+            "%m-%d-%Y",
+            "%Y/%m/%d",
+            "%Y-%m-%d",
+            "%d %B %Y",
+            "%B %d, %Y"
+        ],
+        "DATE_ROLE_KEYWORDS": {  # Words before a date that say what the date is
+            "start": ["start", "starts", "starting", "start date", "commence", "commences", "commencing", "commencement",
+                      "effective", "effective date", "begin", "begins", "beginning"],
+            "end": ["end", "ends", "ending", "end date", "terminate", "terminates", "termination", "expire", "expires",
+                    "expiry", "expiration", "expiration date"],
+            "invoice": ["invoice", "invoiced", "invoice date", "issued", "billed"],
+            "due": ["due", "due date", "payment due", "payable"]
+        },
+        "CHRONOLOGY_RULES": [  # (earlier role, later role, description) checked for every document
+            ("start", "end", "End date before start date"),
+            ("invoice", "due", "Payment due before invoice date")
+        ],
+        "CLAUSE_KEYWORDS": {  # Words that mark a clause's type for the combined detector
+            "payment": ["payment", "payments", "pay", "paid", "payable", "fee", "fees", "price", "invoice",
+                        "installment", "instalment"],
+            "penalty": ["penalty", "penalties", "late fee", "late charge", "liquidated damages", "fine"],
+            "termination": ["terminate", "terminated", "termination", "cancel", "cancellation"],
+            "renewal": ["renew", "renewal", "renews", "renewed", "extension"]
+        },
         "NUMERIC_PATTERNS": [
             r'\$\s*\d+(?:,\d{3})*(?:\.\d+)?',  # Currency with $ sign
             r'€\s*\d+(?:,\d{3})*(?:\.\d+)?',   # Currency with € sign
@@ -46,6 +115,17 @@ def load_config():
             r'\b\d+(?:,\d{3})*(?:\.\d+)?\b'    # Regular numbers
         ],
         
+        "NUMERIC_NEIGHBOURS": int(os.environ.get("NUMERIC_NEIGHBOURS", 1)),  # Following numbers each number is compared with
+        "DISABLED_DETECTORS": [name.strip() for name in os.environ.get("DISABLED_DETECTORS", "").split(",") if name.strip()],  # e.g. "ai"
+        "DETECTOR_CPU_WORKERS": int(os.environ.get("DETECTOR_CPU_WORKERS", os.cpu_count() or 1)),  # Processes for CPU-bound detectors
+        "DETECTOR_IO_WORKERS": int(os.environ.get("DETECTOR_IO_WORKERS", 8)),  # Threads for I/O-bound detectors
+        
+        # Revisions (re-analyze only the changed text of a new version of a processed document)
+        "REVISION_DIFF_ENABLED": os.environ.get("REVISION_DIFF_ENABLED", "false").lower() == "true",
+        "REVISION_LINK_BY_FILENAME": os.environ.get("REVISION_LINK_BY_FILENAME", "false").lower() == "true",  # Uploads without a previous version ID follow the latest of the same name
+        "REVISION_CONTEXT_CHARS": int(os.environ.get("REVISION_CONTEXT_CHARS", 1000)),  # Text around each edit re-checked; above the reach of local detectors
+        "REVISION_MAX_CHANGED_FRACTION": float(os.environ.get("REVISION_MAX_CHANGED_FRACTION", 0.5)),  # Above this, analyze in full
+        
         # Application Settings
         "BATCH_SIZE": int(os.environ.get("BATCH_SIZE", 5)),
         "PROCESSING_THREADS": int(os.environ.get("PROCESSING_THREADS", 2)),
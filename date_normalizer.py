@@ -0,0 +1,104 @@
+import re
+import time
+import functools
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Dates further than this from the current year are treated as misreadings
+MAX_YEARS_PAST = 100
+MAX_YEARS_AHEAD = 50
+
+def current_year():
+    """Return the current year, looked up at most once an hour."""
+    return _year_at_hour(int(time.time() // 3600))
+
+@functools.lru_cache(maxsize=1)
+def _year_at_hour(hour):
+    return datetime.now().year
+
+@functools.lru_cache(maxsize=8192)
+def parse_date(date_str, fmt):
+    """
+    Parse a date string in a known format.
+
+    Results are cached, since contracts repeat the same dates many times.
+
+    Args:
+        date_str (str): Date string
+        fmt (str): strptime format of the string
+
+    Returns:
+        datetime: The parsed date, or None if the string does not match the
+            format or the date is implausibly far in the past or future
+    """
+    try:
+        parsed = datetime.strptime(date_str.strip(), fmt)
+    except ValueError:
+        return None
+
+    year = current_year()
+    if parsed.year < year - MAX_YEARS_PAST or parsed.year > year + MAX_YEARS_AHEAD:
+        return None
+    return parsed
+
+def normalize_date(date_str, pattern_index, config):
+    """
+    Parse a date matched by one of the configured date patterns.
+
+    The format is looked up from the pattern that matched instead of being
+    guessed, using DATE_PATTERN_FORMATS, which lists the strptime format of
+    each DATE_FORMAT_PATTERNS entry.
+
+    Args:
+        date_str (str): Matched date string
+        pattern_index (int): Index of the matching pattern in DATE_FORMAT_PATTERNS
+        config (dict): Configuration settings
+
+    Returns:
+        datetime: The parsed date, or None if it cannot be parsed
+    """
+    formats = config.get("DATE_PATTERN_FORMATS", [])
+    if pattern_index >= len(formats) or not formats[pattern_index]:
+        return None
+    return parse_date(date_str, formats[pattern_index])
+
+def date_role_finder(config):
+    """
+    Return a function giving the role of a date from the text before it.
+
+    Args:
+        config (dict): Configuration settings; DATE_ROLE_KEYWORDS maps each
+            role (e.g. 'start', 'due') to words or phrases announcing it
+
+    Returns:
+        callable: Takes the text just before a date and returns the role of
+            the last keyword in it, or None
+    """
+    keywords = tuple((role, tuple(words)) for role, words in config.get("DATE_ROLE_KEYWORDS", {}).items())
+    return _build_role_finder(keywords)
+
+@functools.lru_cache(maxsize=8)
+def _build_role_finder(keywords):
+    roles = {}
+    for role, words in keywords:
+        for word in words:
+            roles[" ".join(word.lower().split())] = role
+    if not roles:
+        return lambda preceding: None
+
+    # Longer phrases first, so "payment due" wins over "payment"
+    alternatives = sorted(roles, key=len, reverse=True)
+    pattern = re.compile(
+        r'\b(?:' + "|".join(re.escape(word).replace(r'\ ', r'\s+') for word in alternatives) + r')\b',
+        re.IGNORECASE
+    )
+
+    def find_role(preceding):
+        last = None
+        for last in pattern.finditer(preceding):
+            pass
+        return roles[" ".join(last.group().lower().split())] if last else None
+
+    return find_role
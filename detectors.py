@@ -0,0 +1,184 @@
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from shared_services import discard_service, get_service
+
+logger = logging.getLogger(__name__)
+
+# Registered detectors in registration order, which is also the order of their anomalies
+DETECTORS = []
+
+class DetectorTotals:
+    """Run counts and cumulative timings per detector across all documents analyzed in this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+
+    def add(self, reports):
+        """Add the reports of one run of the detectors."""
+        with self.lock:
+            for report in reports:
+                totals = self.totals.setdefault(report['name'], {'runs': 0, 'wall_time': 0.0, 'matches': 0, 'anomalies': 0})
+                totals['runs'] += 1
+                totals['wall_time'] = round(totals['wall_time'] + report['wall_time'], 4)
+                totals['matches'] += report['matches']
+                totals['anomalies'] += report['anomalies']
+
+    def stats(self):
+        """Return the totals and average wall time per detector."""
+        with self.lock:
+            return {
+                name: dict(totals, average_time=round(totals['wall_time'] / totals['runs'], 4))
+                for name, totals in self.totals.items()
+            }
+
+def register_detector(name, kind, func, after=(), scope='local'):
+    """
+    Register an anomaly detector.
+
+    A detector is called as func(text, config, inputs), where inputs maps
+    the name of each enabled detector listed in after to its result. It
+    returns a result dictionary with 'anomalies', 'matches' (how many
+    candidates it examined) and optionally 'stats', numeric processing
+    statistics added up across detectors. CPU-bound detectors may run in
+    another process, so func must be a module-level function and its
+    arguments and result must be picklable.
+
+    Most detectors compare matches close to each other, so running them on
+    an excerpt finds the same anomalies as on the whole text around it;
+    detectors comparing text anywhere in a document have 'document' scope.
+
+    Args:
+        name (str): Unique detector name, as used in DISABLED_DETECTORS
+        kind (str): 'cpu' for CPU-bound detectors, 'io' for detectors that
+            mostly wait on other services
+        func (callable): The detector function
+        after (tuple): Names of detectors whose results this one needs
+        scope (str): 'local' or 'document'
+    """
+    if kind not in ('cpu', 'io'):
+        raise ValueError(f"Unknown detector kind: {kind}")
+    if scope not in ('local', 'document'):
+        raise ValueError(f"Unknown detector scope: {scope}")
+    if any(detector['name'] == name for detector in DETECTORS):
+        raise ValueError(f"Detector {name} is already registered")
+    DETECTORS.append({'name': name, 'kind': kind, 'func': func, 'after': tuple(after), 'scope': scope})
+
+def detector_scopes():
+    """Return the scope of each registered detector by name."""
+    return {detector['name']: detector['scope'] for detector in DETECTORS}
+
+def run_detectors(text, config, stats=None, names=None):
+    """
+    Run all enabled detectors on a text, each as soon as its inputs are ready.
+
+    CPU-bound detectors run in a process pool and I/O-bound ones in a thread
+    pool, so independent detectors overlap. Detectors named in
+    DISABLED_DETECTORS are skipped, and so is their output for detectors
+    that run after them.
+
+    Args:
+        text (str): The text content of the document
+        config (dict): Configuration settings
+        stats (dict): Optional dictionary that receives the detectors'
+            processing statistics and a 'detectors' list with the wall time,
+            match count and anomaly count of each detector
+        names (iterable): Only run the enabled detectors with these names;
+            all enabled detectors by default
+
+    Returns:
+        list: The anomalies of all detectors, in registration order, each
+            with the name of its detector under 'detector'
+    """
+    disabled = set(config.get("DISABLED_DETECTORS", []))
+    detectors = [
+        detector for detector in DETECTORS
+        if detector['name'] not in disabled and (names is None or detector['name'] in names)
+    ]
+    enabled = {detector['name'] for detector in detectors}
+
+    results = {}
+    running = {}
+    waiting = list(detectors)
+    try:
+        while waiting or running:
+            for detector in list(waiting):
+                needs = [name for name in detector['after'] if name in enabled]
+                if all(name in results for name in needs):
+                    inputs = {name: results[name] for name in needs}
+                    future = _get_executor(detector['kind'], config).submit(_timed_call, detector['func'], text, config, inputs)
+                    running[future] = detector
+                    waiting.remove(detector)
+            if not running:
+                raise ValueError(f"Detectors {[detector['name'] for detector in waiting]} depend on each other")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)['name']] = future.result()
+    except BrokenProcessPool:
+        _reset_cpu_executor()
+        raise
+    finally:
+        for future in running:
+            future.cancel()
+
+    anomalies = []
+    reports = []
+    for detector in detectors:
+        result = results[detector['name']]
+        for anomaly in result['anomalies']:
+            anomaly['detector'] = detector['name']
+        anomalies.extend(result['anomalies'])
+        reports.append({
+            'name': detector['name'],
+            'kind': detector['kind'],
+            'wall_time': round(result['wall_time'], 4),
+            'matches': result.get('matches', 0),
+            'anomalies': len(result['anomalies'])
+        })
+        if stats is not None:
+            for key, value in result.get('stats', {}).items():
+                stats[key] = stats.get(key, 0) + value
+
+    logger.debug("Detector timings: " + ", ".join(
+        f"{report['name']} {report['wall_time']:.3f}s ({report['matches']} matches, {report['anomalies']} anomalies)"
+        for report in reports
+    ))
+    get_service('detectors', DetectorTotals).add(reports)
+    if stats is not None:
+        stats['detectors'] = reports
+    return anomalies
+
+def _timed_call(func, text, config, inputs):
+    """Run a detector and add its wall time to the result; may run in a pool process."""
+    started = time.perf_counter()
+    result = func(text, config, inputs)
+    result['wall_time'] = time.perf_counter() - started
+    return result
+
+def _get_executor(kind, config):
+    """Return the shared executor for a kind of detector, creating it on first use."""
+    if kind == 'io' or config.get("DETECTOR_CPU_WORKERS", 1) <= 1:
+        # Without spare cores, CPU-bound detectors share the thread pool
+        return get_service('detector_threads', lambda: _start_thread_pool(config.get("DETECTOR_IO_WORKERS", 8)))
+    return get_service('detector_processes', lambda: _start_process_pool(config["DETECTOR_CPU_WORKERS"]))
+
+def _start_thread_pool(workers):
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detector")
+    logger.info(f"Started detector thread pool with {workers} threads")
+    return executor
+
+def _start_process_pool(workers):
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    logger.info(f"Started detector process pool with {workers} processes")
+    return executor
+
+def _reset_cpu_executor():
+    """Drop a broken detector process pool so the next document starts a new one."""
+    executor = discard_service('detector_processes')
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
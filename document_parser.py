@@ -2,17 +2,55 @@ import os
 import logging
 import PyPDF2
 import docx
-import re
+import mmap
+import codecs
+import bisect
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.etree import ElementTree
+from text_normalizer import normalize_text
+from rtf_parser import iter_rtf_paragraphs
 
 logger = logging.getLogger(__name__)
 
-def parse_document(file_path, file_type):
+# Bump whenever extraction or cleaning output changes, to invalidate cached text
+PARSER_VERSION = "5"
+
+# Separator placed between cleaned segments (pages) in the full document text
+SEGMENT_SEPARATOR = " "
+
+# Process pool shared by parallel PDF extractions, created on first use
+pdf_pool = None
+pdf_pool_lock = threading.Lock()
+
+# Bytes inspected when detecting the encoding of plain-text files
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# Windows a TXT word may span before it is split to keep memory bounded
+MAX_CARRY_WINDOWS = 4
+
+# WordprocessingML element names used by the streaming DOCX backend
+W_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY = W_NAMESPACE + "body"
+W_P = W_NAMESPACE + "p"
+W_T = W_NAMESPACE + "t"
+W_TAB = W_NAMESPACE + "tab"
+W_BR = W_NAMESPACE + "br"
+W_CR = W_NAMESPACE + "cr"
+W_TBL = W_NAMESPACE + "tbl"
+W_TC = W_NAMESPACE + "tc"
+
+def parse_document(file_path, file_type, config=None):
     """
     Parse a document and extract its text content.
     
     Args:
         file_path (str): Path to the document file
         file_type (str): Type of the document (pdf, docx, txt, etc.)
+        config (dict): Configuration settings
         
     Returns:
         str: Extracted text content
@@ -26,11 +64,13 @@ def parse_document(file_path, file_type):
         
         # Extract text based on file type
         if file_type.lower() == 'pdf':
-            return extract_text_from_pdf(file_path)
+            return extract_text_from_pdf(file_path, config)
         elif file_type.lower() in ['docx', 'doc']:
-            return extract_text_from_docx(file_path)
+            return extract_text_from_docx(file_path, config)
         elif file_type.lower() == 'txt':
-            return extract_text_from_txt(file_path)
+            return extract_text_from_txt(file_path, config)
+        elif file_type.lower() == 'rtf':
+            return extract_text_from_rtf(file_path)
         else:
             logger.warning(f"Unsupported file type: {file_type}")
             return None
@@ -39,61 +79,272 @@ def parse_document(file_path, file_type):
         logger.error(f"Error parsing document: {e}", exc_info=True)
         return None
 
-def extract_text_from_pdf(file_path):
+def extract_text_from_pdf(file_path, config=None):
     """Extract text from a PDF file."""
-    text = ""
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            num_pages = len(reader.pages)
-            
-            for page_num in range(num_pages):
-                page = reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
-        
-        # Clean up the text
-        text = clean_text(text)
-        logger.debug(f"Extracted {len(text)} characters from PDF with {num_pages} pages")
+        pages = list(iter_pdf_pages(file_path, config))
+        text = join_segments(pages)
+        logger.debug(f"Extracted {len(text)} characters from PDF with {len(pages)} non-empty pages")
         return text
         
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {e}", exc_info=True)
         return None
 
-def extract_text_from_docx(file_path):
+def iter_pdf_pages(file_path, config=None):
+    """
+    Yield the cleaned text of a PDF one page at a time.
+    
+    Pages are read and cleaned lazily, so callers can start consuming the
+    document before the whole file has been extracted. Pages without any
+    text after cleaning are skipped. Documents with more pages than
+    PDF_PARALLEL_PAGE_THRESHOLD are extracted across a process pool and
+    reassembled in page order.
+    
+    Args:
+        file_path (str): Path to the PDF file
+        config (dict): Configuration settings
+        
+    Yields:
+        dict: Page info with page_number, text, start_offset and end_offset,
+            where the offsets refer to the text produced by join_segments, and
+            an offset_map from the page text back to the raw page extraction
+    """
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        num_pages = len(reader.pages)
+        threshold = config.get("PDF_PARALLEL_PAGE_THRESHOLD", 0) if config else 0
+        workers = config.get("PDF_PARALLEL_WORKERS", 1) if config else 1
+        
+        if threshold and workers > 1 and num_pages > threshold:
+            logger.debug(f"Extracting {num_pages} PDF pages across {workers} processes")
+            yield from _number_segments(_iter_pages_parallel(file_path, num_pages, workers))
+        else:
+            yield from _number_segments(normalize_text(page.extract_text() or "") for page in reader.pages)
+
+def _iter_pages_parallel(file_path, num_pages, workers):
+    """Extract and clean page ranges in the process pool, yielding pages in order."""
+    pool = _get_pdf_pool(workers)
+    # Use a few ranges per worker so uneven pages still balance across the pool
+    range_size = max(1, -(-num_pages // (workers * 4)))
+    futures = [
+        pool.submit(_extract_page_range, file_path, start, min(start + range_size, num_pages))
+        for start in range(0, num_pages, range_size)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    except BrokenProcessPool:
+        _reset_pdf_pool()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+
+def _extract_page_range(file_path, start, end):
+    """Extract and normalize pages [start, end) of a PDF; runs in a pool process."""
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return [normalize_text(reader.pages[page_num].extract_text() or "") for page_num in range(start, end)]
+
+def _get_pdf_pool(workers):
+    """Return the shared PDF extraction pool, creating it on first use."""
+    global pdf_pool
+    with pdf_pool_lock:
+        if pdf_pool is None:
+            pdf_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Started PDF extraction pool with {workers} processes")
+        return pdf_pool
+
+def _reset_pdf_pool():
+    """Drop a broken PDF extraction pool so the next document starts a new one."""
+    global pdf_pool
+    with pdf_pool_lock:
+        if pdf_pool is not None:
+            pdf_pool.shutdown(wait=False, cancel_futures=True)
+            pdf_pool = None
+
+def iter_document_segments(file_path, file_type, config=None):
+    """
+    Yield the cleaned text of a document segment by segment.
+    
+    PDFs are streamed page by page, DOCX and RTF files paragraph by
+    paragraph and TXT files in fixed-size windows. Extraction errors are propagated to
+    the caller.
+    
+    Args:
+        file_path (str): Path to the document file
+        file_type (str): Type of the document (pdf, docx, txt, etc.)
+        config (dict): Configuration settings
+        
+    Yields:
+        dict: Segment info with page_number (None for formats without
+            pages), text, start_offset, end_offset and offset_map (None when
+            the raw text is not available)
+    """
+    file_type = file_type.lower()
+    if file_type == 'pdf':
+        yield from iter_pdf_pages(file_path, config)
+    elif file_type in ['docx', 'doc']:
+        yield from iter_docx_blocks(file_path, config)
+    elif file_type == 'txt':
+        yield from iter_txt_windows(file_path, config)
+    elif file_type == 'rtf':
+        yield from iter_rtf_blocks(file_path)
+    else:
+        logger.warning(f"Unsupported file type: {file_type}")
+
+def join_segments(segments):
+    """
+    Join cleaned segments into the full document text.
+    
+    Args:
+        segments (iterable): Segments as yielded by iter_document_segments
+        
+    Returns:
+        str: Full text, consistent with the segment offsets
+    """
+    return SEGMENT_SEPARATOR.join(segment['text'] for segment in segments)
+
+def find_segment(segments, position):
+    """
+    Find the segment containing a position of the joined text.
+    
+    Args:
+        segments (list): Segments in document order
+        position (int): Character position in the joined text
+        
+    Returns:
+        dict: The matching segment, or None if the position is out of range
+    """
+    starts = [segment['start_offset'] for segment in segments]
+    index = bisect.bisect_right(starts, position) - 1
+    if index >= 0 and position <= segments[index]['end_offset']:
+        return segments[index]
+    return None
+
+def _number_segments(normalized_texts, paginated=True):
+    """Attach page numbers and joined-text offsets to (text, offset_map) pairs."""
+    offset = 0
+    for index, (text, offset_map) in enumerate(normalized_texts, start=1):
+        if not text:
+            continue
+        if offset:
+            offset += len(SEGMENT_SEPARATOR)
+        yield {
+            'page_number': index if paginated else None,
+            'text': text,
+            'start_offset': offset,
+            'end_offset': offset + len(text),
+            'offset_map': offset_map
+        }
+        offset += len(text)
+
+def extract_text_from_docx(file_path, config=None):
     """Extract text from a DOCX file."""
-    text = ""
     try:
-        doc = docx.Document(file_path)
-        
-        # Extract text from paragraphs
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        
-        # Extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    text += cell.text + " "
-                text += "\n"
-        
-        # Clean up the text
-        text = clean_text(text)
-        logger.debug(f"Extracted {len(text)} characters from DOCX")
+        blocks = list(iter_docx_blocks(file_path, config))
+        text = join_segments(blocks)
+        logger.debug(f"Extracted {len(text)} characters from DOCX with {len(blocks)} blocks")
         return text
         
     except Exception as e:
         logger.error(f"Error extracting text from DOCX: {e}", exc_info=True)
         return None
 
-def extract_text_from_txt(file_path):
+def iter_docx_blocks(file_path, config=None):
+    """
+    Yield the cleaned text of a DOCX paragraph or table cell at a time.
+    
+    With DOCX_BACKEND set to "stream" (the default), word/document.xml is
+    streamed straight out of the package with an incremental XML parser and
+    blocks come out in document order. Files the streaming backend cannot
+    read fall back to python-docx, which yields all paragraphs followed by
+    all table cells.
+    
+    Args:
+        file_path (str): Path to the DOCX file
+        config (dict): Configuration settings
+        
+    Yields:
+        dict: Block info with text, start_offset, end_offset and offset_map
+    """
+    backend = config.get("DOCX_BACKEND", "stream") if config else "stream"
+    if backend == "stream":
+        yielded = False
+        try:
+            for block in _number_segments((normalize_text(text) for text in _iter_docx_xml_blocks(file_path)), paginated=False):
+                yielded = True
+                yield block
+            return
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+            # Blocks already handed out cannot be taken back, so only fall back before the first one
+            if yielded:
+                raise
+            logger.warning(f"Streaming DOCX backend failed for {file_path}, falling back to python-docx: {e}")
+    
+    yield from _number_segments((normalize_text(text) for text in _iter_python_docx_blocks(file_path)), paginated=False)
+
+def _iter_docx_xml_blocks(file_path):
+    """Stream raw paragraph and table cell text out of word/document.xml."""
+    with zipfile.ZipFile(file_path) as package:
+        with package.open('word/document.xml') as document_xml:
+            body = None
+            table_depth = 0
+            runs = []
+            cell_paragraphs = []
+            
+            for event, element in ElementTree.iterparse(document_xml, events=('start', 'end')):
+                tag = element.tag
+                if event == 'start':
+                    if tag == W_BODY:
+                        body = element
+                    elif tag == W_TBL:
+                        table_depth += 1
+                    continue
+                
+                if tag == W_T:
+                    runs.append(element.text or "")
+                elif tag == W_TAB:
+                    runs.append("\t")
+                elif tag in (W_BR, W_CR):
+                    runs.append("\n")
+                elif tag == W_P:
+                    if table_depth:
+                        cell_paragraphs.append("".join(runs))
+                    else:
+                        yield "".join(runs)
+                    runs = []
+                elif tag == W_TC and table_depth == 1:
+                    # Nested tables are folded into the text of their outer cell
+                    yield "\n".join(cell_paragraphs)
+                    cell_paragraphs = []
+                elif tag == W_TBL:
+                    table_depth -= 1
+                
+                # Drop finished top-level blocks so memory stays bounded by the largest block
+                if body is not None and table_depth == 0 and tag in (W_P, W_TBL):
+                    body.clear()
+
+def _iter_python_docx_blocks(file_path):
+    """Yield raw paragraph and table cell text using python-docx."""
+    doc = docx.Document(file_path)
+    
+    for para in doc.paragraphs:
+        yield para.text
+    
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                yield cell.text
+
+def extract_text_from_txt(file_path, config=None):
     """Extract text from a TXT file."""
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-            text = file.read()
-        
-        # Clean up the text
-        text = clean_text(text)
+        text = join_segments(iter_txt_windows(file_path, config))
         logger.debug(f"Extracted {len(text)} characters from TXT file")
         return text
         
@@ -101,18 +352,121 @@ def extract_text_from_txt(file_path):
         logger.error(f"Error extracting text from TXT: {e}", exc_info=True)
         return None
 
-def clean_text(text):
-    """Clean and normalize extracted text."""
-    if not text:
-        return ""
+def iter_txt_windows(file_path, config=None):
+    """
+    Yield the cleaned text of a TXT file in fixed-size windows.
+    
+    With TXT_MMAP_ENABLED the file is memory-mapped, its encoding detected
+    from a prefix sample, and it is decoded and normalized TXT_WINDOW_SIZE
+    bytes at a time. Windows are cut at whitespace so no word is split
+    between two of them. Otherwise the whole file is read as UTF-8.
+    
+    Args:
+        file_path (str): Path to the TXT file
+        config (dict): Configuration settings
+        
+    Yields:
+        dict: Window info with text, start_offset, end_offset and an
+            offset_map back to character positions in the decoded file
+    """
+    use_mmap = config.get("TXT_MMAP_ENABLED", True) if config else True
+    window_size = config.get("TXT_WINDOW_SIZE", 1024 * 1024) if config else 1024 * 1024
     
-    # Replace multiple spaces with a single space
-    text = re.sub(r'\s+', ' ', text)
+    if not use_mmap:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            yield from _number_segments([normalize_text(file.read())], paginated=False)
+        return
     
-    # Replace multiple newlines with a single newline
-    text = re.sub(r'\n+', '\n', text)
+    if os.path.getsize(file_path) == 0:
+        return
     
-    # Remove strange characters but keep important punctuation
-    text = re.sub(r'[^\w\s.,;:!?$%&()-+=\'"\/\\]', '', text)
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        encoding = detect_encoding(mapped[:ENCODING_SAMPLE_SIZE])
+        logger.debug(f"Decoding {file_path} as {encoding} in windows of {window_size} bytes")
+        yield from _number_segments(_iter_decoded_windows(mapped, encoding, window_size), paginated=False)
+
+def _iter_decoded_windows(mapped, encoding, window_size):
+    """Decode and normalize a memory-mapped file window by window."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    carry = ""
+    base = 0
+    size = len(mapped)
     
-    return text.strip()
+    for start in range(0, size, window_size):
+        final = start + window_size >= size
+        decoded = carry + decoder.decode(mapped[start:start + window_size], final=final)
+        
+        # Hold back the trailing partial word for the next window
+        cut = len(decoded)
+        if not final:
+            while cut > 0 and not decoded[cut - 1].isspace():
+                cut -= 1
+            if cut == 0:
+                if len(decoded) < MAX_CARRY_WINDOWS * window_size:
+                    carry = decoded
+                    continue
+                # No whitespace for several windows; split rather than buffer without bound
+                cut = len(decoded)
+        carry = decoded[cut:]
+        
+        text, offset_map = normalize_text(decoded[:cut])
+        yield text, offset_map.shifted(base)
+        base += cut
+
+def detect_encoding(sample):
+    """
+    Detect the text encoding of a file from a prefix sample.
+    
+    Args:
+        sample (bytes): Leading bytes of the file
+        
+    Returns:
+        str: Codec name suitable for codecs.getincrementaldecoder
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+        return 'utf-32'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    
+    # UTF-16 without a BOM shows up as NUL bytes on every other position
+    if sample and sample.count(b'\x00') > len(sample) // 4:
+        even_nuls = sample[0::2].count(b'\x00')
+        odd_nuls = sample[1::2].count(b'\x00')
+        return 'utf-16-be' if even_nuls > odd_nuls else 'utf-16-le'
+    
+    try:
+        # The sample may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+def extract_text_from_rtf(file_path):
+    """Extract text from an RTF file."""
+    try:
+        blocks = list(iter_rtf_blocks(file_path))
+        text = join_segments(blocks)
+        logger.debug(f"Extracted {len(text)} characters from RTF with {len(blocks)} paragraphs")
+        return text
+        
+    except Exception as e:
+        logger.error(f"Error extracting text from RTF: {e}", exc_info=True)
+        return None
+
+def iter_rtf_blocks(file_path):
+    """
+    Yield the cleaned text of an RTF file one paragraph at a time.
+    
+    Args:
+        file_path (str): Path to the RTF file
+        
+    Yields:
+        dict: Paragraph info with text, start_offset, end_offset and offset_map
+    """
+    yield from _number_segments((normalize_text(text) for text in iter_rtf_paragraphs(file_path)), paginated=False)
+
+def clean_text(text):
+    """Clean and normalize extracted text."""
+    return normalize_text(text)[0]
@@ -0,0 +1,167 @@
+import os
+import json
+import zlib
+import hashlib
+import logging
+import tempfile
+import threading
+from document_parser import PARSER_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Settings that change the extracted text or its offsets, and so are part of the cache key
+EXTRACTION_CONFIG_KEYS = ("DOCX_BACKEND", "TXT_MMAP_ENABLED")
+
+class ExtractionCache:
+    """
+    Content-addressed on-disk cache of extracted document text.
+
+    Entries are keyed by the SHA-256 of the file contents plus the parser
+    version and extraction settings, stored as zlib-compressed JSON and evicted least recently used
+    first once the cache directory grows beyond its size budget.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+        logger.debug(f"Extraction cache at {cache_dir} holds {self.total_bytes} bytes")
+
+    def key_for(self, file_path, config=None):
+        """
+        Compute the cache key for a file.
+
+        Args:
+            file_path (str): Path to the document file
+            config (dict): Configuration settings the file is extracted with
+
+        Returns:
+            str: Hex digest of the file contents, parser version and the
+                EXTRACTION_CONFIG_KEYS settings
+        """
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        digest.update(f"parser-{PARSER_VERSION}".encode())
+        for name in EXTRACTION_CONFIG_KEYS:
+            digest.update(f"\0{name}={(config or {}).get(name)!r}".encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached extraction.
+
+        Args:
+            key (str): Cache key from key_for
+
+        Returns:
+            dict: Cached entry with text and pages, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = json.loads(zlib.decompress(file.read()))
+            # Refresh the modification time so eviction sees this entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            entry = None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Discarding unreadable extraction cache entry {key}: {e}")
+            self._remove(path)
+            entry = None
+
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """
+        Store an extraction in the cache and evict old entries if needed.
+
+        Args:
+            key (str): Cache key from key_for
+            entry (dict): JSON-serializable entry with text and pages
+        """
+        data = zlib.compress(json.dumps(entry).encode('utf-8'))
+        if len(data) > self.max_bytes:
+            logger.debug(f"Extraction of {len(data)} bytes exceeds the cache budget; not caching")
+            return
+
+        path = self._path(key)
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            # Replace under the lock, so concurrent puts of one key count its size once
+            with self.lock:
+                try:
+                    replaced_bytes = os.path.getsize(path)
+                except FileNotFoundError:
+                    replaced_bytes = 0
+                os.replace(temp_path, path)
+                self.total_bytes += len(data) - replaced_bytes
+                over_budget = self.total_bytes > self.max_bytes
+        except OSError as e:
+            logger.warning(f"Failed to write extraction cache entry {key}: {e}")
+            return
+        if over_budget:
+            self._evict()
+
+    def stats(self):
+        """Return hit/miss counters and current size of the cache."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'size_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits its budget."""
+        with self.lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in entries)
+            for path, _, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if self._remove(path):
+                    total -= size
+                    self.evictions += 1
+            self.total_bytes = total
+        logger.debug(f"Extraction cache evicted down to {total} bytes")
+
+    def _entries(self):
+        """List (path, last_used, size) for every cache entry on disk."""
+        entries = []
+        for dir_entry in os.scandir(self.cache_dir):
+            if dir_entry.is_file() and dir_entry.name.endswith('.json.z'):
+                try:
+                    stat = dir_entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((dir_entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json.z")
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
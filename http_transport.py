@@ -0,0 +1,169 @@
+import re
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from shared_services import get_service
+
+logger = logging.getLogger(__name__)
+
+# Methods that can be repeated without changing anything on the server
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Status codes worth retrying: the server was briefly unavailable or overloaded
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Numeric path segments (document ids etc.) are grouped into one endpoint
+PATH_ID_PATTERN = re.compile(r'/\d+(?=/|$)')
+
+class HTTPTransport:
+    """
+    Shared HTTP client with a keep-alive connection pool per host.
+
+    Requests to the same scheme, host and port reuse one session and its
+    pooled connections. Idempotent requests that fail with a connection
+    error, a timeout or a retryable status are retried with jittered
+    exponential backoff, and the latency of every request is recorded in a
+    histogram per endpoint.
+    """
+
+    def __init__(self, pool_maxsize, max_retries, backoff_base, backoff_max):
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def request(self, method, url, idempotent=None, deadline=None, **kwargs):
+        """
+        Send a request through the pooled session for its host.
+
+        Args:
+            method (str): HTTP method
+            url (str): Request URL
+            idempotent (bool): Whether the request may be retried; defaults to
+                True for idempotent HTTP methods. Pass True for POSTs without
+                side effects, such as model completions.
+            deadline (float): Optional time.monotonic() value after which no
+                retry is started; the timeout of each attempt is cut to fit
+            **kwargs: Passed on to requests.Session.request
+
+        Returns:
+            requests.Response: The response of the last attempt
+
+        Raises:
+            requests.RequestException: If the last attempt failed
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = 1 + (self.max_retries if idempotent else 0)
+
+        parts = urlsplit(url)
+        session = self._session(f"{parts.scheme}://{parts.netloc}")
+        endpoint = f"{method} {parts.netloc}{PATH_ID_PATTERN.sub('/{id}', parts.path)}"
+
+        for attempt in range(attempts):
+            started = time.monotonic()
+            if deadline is not None and kwargs.get('timeout') is not None:
+                kwargs['timeout'] = max(0.001, min(kwargs['timeout'], deadline - started))
+
+            # Full jitter: wait a random time up to the exponential backoff
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            last_attempt = attempt + 1 >= attempts
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(endpoint, time.monotonic() - started, error=True)
+                if last_attempt or self._past(deadline, backoff):
+                    raise
+                logger.warning(f"{endpoint} failed ({e}); retrying")
+            else:
+                retryable = response.status_code in RETRY_STATUS_CODES
+                self._record(endpoint, time.monotonic() - started, error=retryable or response.status_code >= 500)
+                if not retryable or last_attempt or self._past(deadline, backoff):
+                    return response
+                logger.warning(f"{endpoint} returned {response.status_code}; retrying")
+                response.close()
+            time.sleep(backoff)
+
+    def get(self, url, **kwargs):
+        """Send a GET request; see request()."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request; see request()."""
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        """Return request counts and latency histograms per endpoint."""
+        with self.lock:
+            return {
+                endpoint: {
+                    'requests': data['requests'],
+                    'errors': data['errors'],
+                    'average_ms': round(data['total_ms'] / data['requests'], 1) if data['requests'] else 0.0,
+                    'histogram_ms': {
+                        (f"<={bound}" if bound is not None else f">{LATENCY_BUCKETS_MS[-1]}"): count
+                        for bound, count in zip(LATENCY_BUCKETS_MS + (None,), data['buckets'])
+                    }
+                }
+                for endpoint, data in self.endpoints.items()
+            }
+
+    def _session(self, origin):
+        """Return the pooled session for an origin, creating it on first use."""
+        with self.lock:
+            session = self.sessions.get(origin)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=0)
+                session.mount(origin + "/", adapter)
+                self.sessions[origin] = session
+                logger.debug(f"Opened HTTP connection pool for {origin} ({self.pool_maxsize} connections)")
+            return session
+
+    @staticmethod
+    def _past(deadline, backoff):
+        """Return True if a retry after the backoff would start past the deadline."""
+        return deadline is not None and time.monotonic() + backoff >= deadline
+
+    def _record(self, endpoint, seconds, error=False):
+        elapsed_ms = seconds * 1000
+        with self.lock:
+            data = self.endpoints.get(endpoint)
+            if data is None:
+                data = {'requests': 0, 'errors': 0, 'total_ms': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+                self.endpoints[endpoint] = data
+            data['requests'] += 1
+            data['errors'] += error
+            data['total_ms'] += elapsed_ms
+            bucket = next((index for index, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound),
+                          len(LATENCY_BUCKETS_MS))
+            data['buckets'][bucket] += 1
+
+def get_transport(config):
+    """
+    Return the process-wide HTTP transport, creating it on first use.
+
+    Args:
+        config (dict): Configuration settings
+
+    Returns:
+        HTTPTransport: The shared transport
+    """
+    return get_service('http', lambda: HTTPTransport(
+        pool_maxsize=config["HTTP_POOL_MAXSIZE"],
+        max_retries=config["HTTP_MAX_RETRIES"],
+        backoff_base=config["HTTP_BACKOFF_BASE"],
+        backoff_max=config["HTTP_BACKOFF_MAX"]
+    ))
@@ -0,0 +1,85 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for a JSON array of objects embedded in model output.
+
+    Text is fed in pieces as it is generated. Anything before the opening
+    '[' is ignored, and each object in the array is decoded as soon as its
+    closing brace arrives. A malformed object is skipped without losing the
+    others, and done is set once the array is closed.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.done = False
+        self.skipped = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.partial = ""  # Text of an object continued from earlier pieces
+
+    def feed(self, text):
+        """
+        Parse the next piece of generated text.
+
+        Args:
+            text (str): Text following what was fed before
+
+        Returns:
+            list: Objects completed in this piece, in order
+        """
+        objects = []
+        object_start = 0 if self.depth else None
+
+        for pos, char in enumerate(text):
+            if self.done:
+                break
+            if not self.started:
+                if char == '[':
+                    self.started = True
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                if self.depth == 0:
+                    object_start = pos
+                self.depth += 1
+            elif char in '}]':
+                if self.depth == 0:
+                    # Closing bracket of the array itself
+                    self.done = True
+                    break
+                self.depth -= 1
+                if self.depth == 0:
+                    self._decode(self.partial + text[object_start:pos + 1], objects)
+                    self.partial = ""
+                    object_start = None
+
+        if self.depth and object_start is not None:
+            self.partial += text[object_start:]
+        return objects
+
+    def _decode(self, object_text, objects):
+        try:
+            value = json.loads(object_text)
+        except json.JSONDecodeError as e:
+            self.skipped += 1
+            logger.warning(f"Skipping malformed object in model response: {e}")
+            logger.debug(f"Malformed object: {object_text}")
+            return
+        if isinstance(value, dict):
+            objects.append(value)
+        else:
+            self.skipped += 1
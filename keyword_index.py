@@ -0,0 +1,145 @@
+import re
+import bisect
+import functools
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Clause spans end at sentence or clause punctuation followed by whitespace, or at
+# blank lines; single line breaks are usually wrapped lines within a clause
+SPAN_BOUNDARY_PATTERN = re.compile(r'(?<=[.;!?])\s+|\n\s*\n\s*')
+
+# Whitespace characters matched by the space in a multi-word keyword
+WHITESPACE_TABLE = str.maketrans('\t\n\r\f\v\xa0', '      ')
+
+class KeywordIndex:
+    """
+    Aho-Corasick automaton over a fixed vocabulary of labelled keywords.
+
+    The automaton is built once; each search then finds every occurrence of
+    every keyword in a single pass over the text, in time linear in the
+    length of the text plus the number of occurrences. Matching ignores
+    case and only reports whole words.
+    """
+
+    def __init__(self, keywords):
+        """
+        Build the automaton.
+
+        Args:
+            keywords (iterable): (keyword, label) pairs; a keyword may be a
+                phrase of several words
+        """
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+
+        for keyword, label in keywords:
+            word = " ".join(keyword.lower().split())
+            if not word:
+                continue
+            state = 0
+            for char in word:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                    self.goto[state][char] = next_state
+                state = next_state
+            self.output[state] += ((len(word), label),)
+
+        # Failure links in breadth-first order, so each state's link is set
+        # before its children's; outputs include those of the failure state
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+        logger.debug(f"Built keyword automaton with {len(self.goto)} states")
+
+    def find(self, text):
+        """
+        Find every whole-word keyword occurrence in a text.
+
+        Args:
+            text (str): Text to search in
+
+        Yields:
+            tuple: (start, end, label) in order of end position
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # A few characters lowercase to several; keep positions aligned
+            lowered = "".join(char if len(char.lower()) != 1 else char.lower() for char in text)
+        lowered = lowered.translate(WHITESPACE_TABLE)
+
+        goto, fail, output = self.goto, self.fail, self.output
+        text_length = len(text)
+        state = 0
+        for pos, char in enumerate(lowered):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                end = pos + 1
+                for length, label in output[state]:
+                    start = end - length
+                    if (start == 0 or not text[start - 1].isalnum()) and (end == text_length or not text[end].isalnum()):
+                        yield start, end, label
+
+def clause_spans(text, index):
+    """
+    Tag the clauses of a text with the labels of the keywords they contain.
+
+    Args:
+        text (str): Text to tag
+        index (KeywordIndex): Automaton over the clause vocabulary
+
+    Returns:
+        list: (start, end, label) for each clause and each label found in
+            it, in text order
+    """
+    boundaries = [boundary.end() for boundary in SPAN_BOUNDARY_PATTERN.finditer(text)]
+
+    spans = []
+    seen = set()
+    for start, _, label in index.find(text):
+        clause = bisect.bisect_right(boundaries, start)
+        span_start = boundaries[clause - 1] if clause else 0
+        span_end = boundaries[clause] if clause < len(boundaries) else len(text)
+        if (span_start, label) not in seen:
+            seen.add((span_start, label))
+            spans.append((span_start, span_end, label))
+
+    spans.sort()
+    return spans
+
+def get_clause_index(config):
+    """
+    Return the keyword automaton for the clause vocabulary in a configuration.
+
+    The automaton is built once and reused for every document analyzed with
+    the same vocabulary.
+
+    Args:
+        config (dict): Configuration settings; CLAUSE_KEYWORDS maps each
+            clause type to its keywords
+
+    Returns:
+        KeywordIndex: The automaton, labelling matches with clause types
+    """
+    vocabulary = tuple((clause_type, tuple(words)) for clause_type, words in config.get("CLAUSE_KEYWORDS", {}).items())
+    return _build_clause_index(vocabulary)
+
+@functools.lru_cache(maxsize=8)
+def _build_clause_index(vocabulary):
+    return KeywordIndex((word, clause_type) for clause_type, words in vocabulary for word in words)
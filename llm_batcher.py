@@ -0,0 +1,178 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from http_transport import get_transport
+from shared_services import get_service
+
+logger = logging.getLogger(__name__)
+
+class LLMBatcher:
+    """
+    Process-wide micro-batcher for vLLM completion requests.
+
+    Prompts submitted from any thread are queued and sent together as one
+    multi-prompt request to the OpenAI-compatible /v1/completions endpoint.
+    A batch is flushed as soon as it holds max_batch_size prompts or when
+    max_wait seconds have passed since its first prompt arrived. Each
+    completion is routed back to the caller through a future.
+    """
+
+    def __init__(self, url, model, max_batch_size, max_wait, max_concurrent_batches, transport, request_timeout):
+        self.url = url
+        self.transport = transport
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.request_timeout = request_timeout
+
+        self.pending = queue.Queue()
+        self.sender = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="llm-batch")
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.prompts = 0
+        self.size_flushes = 0
+        self.wait_flushes = 0
+        self.errors = 0
+
+        self.collector = threading.Thread(target=self._collect, name="llm-batcher", daemon=True)
+        self.collector.start()
+
+    def submit(self, prompt, temperature, max_tokens):
+        """
+        Queue a prompt for the next batch.
+
+        Args:
+            prompt (str): Prompt to complete
+            temperature (float): Sampling temperature
+            max_tokens (int): Maximum number of tokens to generate
+
+        Returns:
+            Future: Resolves to the generated text
+        """
+        future = Future()
+        self.pending.put((prompt, (temperature, max_tokens), future))
+        return future
+
+    def complete(self, prompt, temperature, max_tokens, timeout=None):
+        """
+        Complete a prompt as part of a batch, blocking until it is done.
+
+        Args:
+            prompt (str): Prompt to complete
+            temperature (float): Sampling temperature
+            max_tokens (int): Maximum number of tokens to generate
+            timeout (float): Seconds to wait for the completion; defaults to
+                the batch request timeout
+
+        Returns:
+            str: The generated text
+        """
+        if timeout is None:
+            timeout = self.request_timeout + self.max_wait
+        return self.submit(prompt, temperature, max_tokens).result(timeout=timeout)
+
+    def stats(self):
+        """Return batch counters and the average fill of sent batches."""
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'prompts': self.prompts,
+                'average_batch_size': round(self.prompts / self.batches, 2) if self.batches else 0.0,
+                'average_batch_fill': round(self.prompts / (self.batches * self.max_batch_size), 3) if self.batches else 0.0,
+                'size_flushes': self.size_flushes,
+                'wait_flushes': self.wait_flushes,
+                'errors': self.errors,
+                'pending': self.pending.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000)
+            }
+
+    def _collect(self):
+        """Gather queued prompts into batches and hand them to the sender pool."""
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            with self.lock:
+                if len(batch) >= self.max_batch_size:
+                    self.size_flushes += 1
+                else:
+                    self.wait_flushes += 1
+
+            # Prompts with different sampling parameters cannot share a request
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[1], []).append(request)
+            for params, group in groups.items():
+                self.sender.submit(self._send, params, group)
+
+    def _send(self, params, batch):
+        """Send one batch and resolve the futures of its prompts."""
+        temperature, max_tokens = params
+        payload = {
+            "model": self.model,
+            "prompt": [prompt for prompt, _, _ in batch],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+        try:
+            # Completions have no side effects, so failed batches may be resent
+            response = self.transport.post(self.url, json=payload, timeout=self.request_timeout, idempotent=True)
+            response.raise_for_status()
+            choices = response.json().get("choices", [])
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            logger.error(f"Batched vLLM request with {len(batch)} prompts failed: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self.lock:
+            self.batches += 1
+            self.prompts += len(batch)
+        logger.debug(f"Sent vLLM batch of {len(batch)} prompts")
+
+        texts = {choice.get("index"): choice.get("text", "") for choice in choices}
+        for index, (_, _, future) in enumerate(batch):
+            if index in texts:
+                future.set_result(texts[index])
+            else:
+                future.set_exception(RuntimeError(f"No completion returned for prompt {index} of the batch"))
+
+def get_batcher(config):
+    """
+    Return the process-wide batcher, creating it on first use.
+
+    Args:
+        config (dict): Configuration settings
+
+    Returns:
+        LLMBatcher: The shared batcher
+    """
+    return get_service('llm_batcher', lambda: _start_batcher(config))
+
+def _start_batcher(config):
+    batcher = LLMBatcher(
+        url=f"http://{config['VLLM_HOST']}:{config['VLLM_PORT']}/v1/completions",
+        model=config["MODEL_NAME"],
+        max_batch_size=config["VLLM_BATCH_MAX_SIZE"],
+        max_wait=config["VLLM_BATCH_MAX_WAIT_MS"] / 1000,
+        max_concurrent_batches=config["VLLM_MAX_CONCURRENT_REQUESTS"],
+        transport=get_transport(config),
+        request_timeout=config["VLLM_BATCH_TIMEOUT"]
+    )
+    logger.info(f"Started vLLM micro-batcher (max {batcher.max_batch_size} prompts, "
+                f"{config['VLLM_BATCH_MAX_WAIT_MS']} ms wait)")
+    return batcher
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from shared_services import get_service
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """
+    Persistent SQLite cache of anomalies returned by the model per chunk.
+
+    Entries are keyed by a hash of the chunk text, prompt version, model
+    name and sampling parameters, and store the anomalies with positions
+    relative to the chunk. Least recently used entries are evicted once the
+    stored anomalies grow beyond the size budget.
+    """
+
+    def __init__(self, db_path, max_bytes):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, anomalies TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        logger.debug(f"LLM response cache at {db_path} holds {self.total_bytes} bytes")
+
+    @staticmethod
+    def key_for(chunk, prompt_version, model, sampling):
+        """
+        Compute the cache key for a chunk.
+
+        Args:
+            chunk (str): Text of the chunk
+            prompt_version (str): Version of the prompt template
+            model (str): Model name
+            sampling (dict): Sampling parameters of the request
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([prompt_version, model, sampling], sort_keys=True).encode())
+        digest.update(chunk.encode('utf-8', errors='surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Look up the anomalies cached for a chunk.
+
+        Args:
+            key (str): Cache key from key_for
+
+        Returns:
+            list: A fresh copy of the cached anomalies, or None on a miss
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT anomalies FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, anomalies):
+        """
+        Store the anomalies found in a chunk.
+
+        Args:
+            key (str): Cache key from key_for
+            anomalies (list): Anomalies with positions relative to the chunk
+        """
+        data = json.dumps(anomalies)
+        size = len(data)
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, anomalies, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time())
+            )
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current size of the cache."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'size_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits its budget; lock must be held."""
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_bytes -= size
+            self.evictions += 1
+
+def get_llm_cache(config):
+    """
+    Return the process-wide response cache, or None if it is disabled.
+
+    Args:
+        config (dict): Configuration settings
+
+    Returns:
+        LLMResponseCache: The shared cache
+    """
+    if not config.get("LLM_CACHE_ENABLED", False):
+        return None
+    return get_service('llm_cache', lambda: LLMResponseCache(config["LLM_CACHE_PATH"], config["LLM_CACHE_MAX_BYTES"]))
@@ -0,0 +1,60 @@
+def resolve_overlaps(candidates, priority):
+    """
+    Keep only the most specific match for each overlapping span.
+
+    Candidates are swept in start order and grouped into clusters of
+    transitively overlapping intervals. Within a cluster, candidates are
+    accepted in priority order as long as they do not overlap one already
+    accepted. Clusters are resolved as soon as they close, so the resolver
+    works on streams of matches.
+
+    Args:
+        candidates (iterable): Tuples whose first two items are the start and
+            (exclusive) end position, sorted by start position
+        priority (callable): Sort key for candidates in a cluster; candidates
+            that sort first are preferred
+
+    Yields:
+        tuple: The accepted candidates in positional order
+    """
+    cluster = []
+    cluster_end = 0
+    for candidate in candidates:
+        start, end = candidate[0], candidate[1]
+        if end <= start:
+            continue
+        if start >= cluster_end:
+            # Most matches overlap nothing and are passed through as they are
+            if len(cluster) == 1:
+                yield cluster[0]
+            elif cluster:
+                yield from _resolve_cluster(cluster, priority)
+            cluster = [candidate]
+            cluster_end = end
+        else:
+            cluster.append(candidate)
+            if end > cluster_end:
+                cluster_end = end
+
+    if len(cluster) == 1:
+        yield cluster[0]
+    elif cluster:
+        yield from _resolve_cluster(cluster, priority)
+
+def _resolve_cluster(cluster, priority):
+    """Pick non-overlapping candidates of one cluster in priority order."""
+    cluster_start = cluster[0][0]
+    cluster_end = max(candidate[1] for candidate in cluster)
+
+    accepted = []
+    for candidate in sorted(cluster, key=priority):
+        start, end = candidate[0], candidate[1]
+        if start <= cluster_start and end >= cluster_end:
+            # Covers the whole cluster, so nothing else can be accepted
+            if not accepted:
+                return [candidate]
+            continue
+        if all(end <= other[0] or start >= other[1] for other in accepted):
+            accepted.append(candidate)
+    accepted.sort(key=lambda candidate: candidate[0])
+    return accepted
@@ -11,10 +11,14 @@ class Document(db.Model):
     processed = db.Column(db.Boolean, default=False)
     weaviate_id = db.Column(db.String(255), nullable=True)
     content_length = db.Column(db.Integer, nullable=True)
+    previous_version_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=True)  # Earlier revision of the same contract
     
     # Relationship with anomalies
     anomalies = db.relationship('Anomaly', backref='document', lazy=True)
     
+    # Relationship with the previous revision
+    previous_version = db.relationship('Document', remote_side=[id], lazy=True)
+    
     def __repr__(self):
         return f'<Document {self.filename}>'
 
@@ -28,6 +32,10 @@ class Anomaly(db.Model):
     context = db.Column(db.Text, nullable=True)  # Text surrounding the anomaly
     start_position = db.Column(db.Integer, nullable=True)  # Position in text
     end_position = db.Column(db.Integer, nullable=True)  # Position in text
+    page_number = db.Column(db.Integer, nullable=True)  # Page the anomaly starts on, for paginated formats
+    source_start_position = db.Column(db.Integer, nullable=True)  # Position in the raw text of its page or segment
+    source_end_position = db.Column(db.Integer, nullable=True)  # Position in the raw text of its page or segment
+    detector = db.Column(db.String(50), nullable=True)  # Name of the detector that reported it
     detected_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -37,10 +45,13 @@ class ProcessingJob(db.Model):
     """Model representing a document processing job."""
     id = db.Column(db.Integer, primary_key=True)
     document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False)
-    status = db.Column(db.String(50), default='pending')  # pending, processing, completed, failed
+    status = db.Column(db.String(50), default='pending')  # pending, processing, completed, partial, failed, aborted
     start_time = db.Column(db.DateTime, nullable=True)
     end_time = db.Column(db.DateTime, nullable=True)
     error_message = db.Column(db.Text, nullable=True)
+    chunks_skipped = db.Column(db.Integer, default=0)  # Chunks the prefilter kept from the model
+    tokens_saved = db.Column(db.Integer, default=0)  # Estimated prompt tokens not sent to the model
+    detector_stats = db.Column(db.Text)  # JSON list of wall time, match and anomaly counts per detector
     
     def __repr__(self):
         return f'<ProcessingJob {self.id} - {self.status}>'
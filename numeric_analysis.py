@@ -0,0 +1,111 @@
+import numpy as np
+
+# Numbers further apart than this (in characters) are not compared
+NUMERIC_WINDOW_CHARS = 200
+
+# Values differing by more than this factor are reported
+NUMERIC_RATIO_THRESHOLD = 10
+
+# Pairs whose smaller value is at most this are ignored (counts, list items, etc.)
+NUMERIC_MIN_VALUE = 1
+
+# Dates of related roles further apart than this (in characters) are not paired
+CHRONOLOGY_WINDOW_CHARS = 500
+
+def find_numeric_discrepancies(starts, ends, values, neighbours=1, skip=0):
+    """
+    Find pairs of nearby numbers whose values differ by an order of magnitude.
+
+    Each number is compared with the next `neighbours` numbers in the text
+    that start within NUMERIC_WINDOW_CHARS of its end. All comparisons for
+    one neighbour distance are done at once on arrays.
+
+    Args:
+        starts (sequence): Start position of each number, in text order
+        ends (sequence): End position of each number
+        values (sequence): Numeric value of each number
+        neighbours (int): How many following numbers each number is compared with
+        skip (int): Leading numbers that were already compared with each other;
+            only pairs whose second number comes after them are returned
+
+    Returns:
+        tuple: (first, second) index arrays of the discrepant pairs, ordered
+            by first index, then second index
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+
+    firsts = []
+    seconds = []
+    for distance in range(1, min(neighbours, count - 1) + 1):
+        first = np.arange(max(0, skip - distance), count - distance)
+        second = first + distance
+
+        low = np.minimum(values[first], values[second])
+        high = np.maximum(values[first], values[second])
+        ratio = high / np.where(low == 0, 1, low)
+
+        mask = (
+            (starts[second] - ends[first] < NUMERIC_WINDOW_CHARS)
+            & (ratio > NUMERIC_RATIO_THRESHOLD)
+            & (low > NUMERIC_MIN_VALUE)
+        )
+        firsts.append(first[mask])
+        seconds.append(second[mask])
+
+    if not firsts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+    order = np.lexsort((second, first))
+    return first[order], second[order]
+
+def find_chronology_violations(earlier_positions, earlier_days, later_positions, later_days,
+                               max_distance=CHRONOLOGY_WINDOW_CHARS):
+    """
+    Find dates that come before the date they should follow.
+
+    Each date of the later role (e.g. an end date) is paired with the
+    nearest date of the earlier role (e.g. a start date) in the text, on
+    either side, if it is at most max_distance characters away. All pairs
+    are looked up and compared at once on arrays.
+
+    Args:
+        earlier_positions (sequence): Text position of each earlier-role date,
+            in text order
+        earlier_days (sequence): Day ordinal of each earlier-role date
+        later_positions (sequence): Text position of each later-role date,
+            in text order
+        later_days (sequence): Day ordinal of each later-role date
+        max_distance (int): Largest distance in characters between paired dates
+
+    Returns:
+        tuple: (earlier, later) index arrays of the pairs whose later-role
+            date is before its earlier-role date, in order of later index
+    """
+    earlier_positions = np.asarray(earlier_positions, dtype=np.int64)
+    earlier_days = np.asarray(earlier_days, dtype=np.int64)
+    later_positions = np.asarray(later_positions, dtype=np.int64)
+    later_days = np.asarray(later_days, dtype=np.int64)
+
+    if not len(earlier_positions) or not len(later_positions):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    # Nearest earlier-role date before and after each later-role date
+    after = np.searchsorted(earlier_positions, later_positions)
+    before = after - 1
+    last = len(earlier_positions) - 1
+    distance_before = np.where(before >= 0, later_positions - earlier_positions[np.maximum(before, 0)], np.iinfo(np.int64).max)
+    distance_after = np.where(after <= last, earlier_positions[np.minimum(after, last)] - later_positions, np.iinfo(np.int64).max)
+
+    nearest = np.where(distance_before <= distance_after, before, after)
+    distance = np.minimum(distance_before, distance_after)
+    mask = (distance <= max_distance) & (later_days < earlier_days[np.clip(nearest, 0, last)])
+
+    later = np.nonzero(mask)[0]
+    return nearest[later], later
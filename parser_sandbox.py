@@ -0,0 +1,204 @@
+import os
+import time
+import queue
+import logging
+import signal
+import resource
+import multiprocessing
+from document_parser import iter_document_segments
+
+logger = logging.getLogger(__name__)
+
+# How often the parent checks a busy worker's wall time and memory
+POLL_INTERVAL = 0.1
+
+# Address-space cap in the worker, as a multiple of the RSS limit; the parent
+# enforces the RSS limit itself, this only stops runaway allocations between polls
+ADDRESS_SPACE_FACTOR = 4
+
+class ParserAbortedError(Exception):
+    """Raised when a sandboxed parse is killed for exceeding its limits."""
+
+class ParserWorker:
+    """A reusable subprocess that parses documents under resource limits."""
+
+    def __init__(self, max_rss_bytes):
+        self.max_rss_bytes = max_rss_bytes
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        """Start the worker process."""
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.max_rss_bytes * ADDRESS_SPACE_FACTOR),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        logger.debug(f"Started parser worker {self.process.pid}")
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def parse(self, file_path, file_type, config, cpu_seconds, timeout):
+        """
+        Parse a document in the worker.
+
+        Args:
+            file_path (str): Path to the document file
+            file_type (str): Type of the document (pdf, docx, txt, etc.)
+            config (dict): Configuration settings passed to the parser
+            cpu_seconds (int): CPU time allowed for this document
+            timeout (float): Wall-clock seconds allowed for this document
+
+        Returns:
+            list: Segments as yielded by iter_document_segments
+
+        Raises:
+            ParserAbortedError: If the worker was killed or ran out of resources
+        """
+        if not self.is_alive():
+            self.start()
+
+        self.conn.send((file_path, file_type, config, cpu_seconds))
+        deadline = time.monotonic() + timeout
+
+        while not self.conn.poll(POLL_INTERVAL):
+            if not self.process.is_alive():
+                raise ParserAbortedError(self._death_reason(cpu_seconds))
+            if time.monotonic() > deadline:
+                self.kill()
+                raise ParserAbortedError(f"Parsing exceeded the {timeout}s time limit")
+            rss = self._rss_bytes()
+            if rss > self.max_rss_bytes:
+                self.kill()
+                raise ParserAbortedError(
+                    f"Parsing exceeded the memory limit ({rss // (1024 * 1024)} MB > "
+                    f"{self.max_rss_bytes // (1024 * 1024)} MB)"
+                )
+
+        try:
+            status, result = self.conn.recv()
+        except (EOFError, OSError):
+            raise ParserAbortedError(self._death_reason(cpu_seconds))
+
+        if status == 'aborted':
+            self.kill()
+            raise ParserAbortedError(result)
+        if status == 'error':
+            raise RuntimeError(result)
+        return result
+
+    def kill(self):
+        """Kill the worker; the next parse starts a fresh process."""
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+            logger.warning(f"Killed parser worker {self.process.pid}")
+        self._discard()
+
+    def _death_reason(self, cpu_seconds):
+        """Describe why the worker exited and forget it."""
+        self.process.join(timeout=5)
+        exitcode = self.process.exitcode
+        self._discard()
+        if exitcode == -signal.SIGXCPU:
+            return f"Parsing exceeded the {cpu_seconds}s CPU time limit"
+        return f"Parser worker exited unexpectedly (exit code {exitcode})"
+
+    def _discard(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def _rss_bytes(self):
+        """Read the worker's resident set size from /proc."""
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
+
+class ParserSandbox:
+    """
+    Pool of reusable parser workers with per-document limits.
+
+    Each document is parsed in a subprocess limited to
+    PARSER_SANDBOX_CPU_SECONDS of CPU time, PARSER_SANDBOX_MAX_RSS_MB of
+    resident memory and PARSER_SANDBOX_TIMEOUT seconds of wall time. A
+    worker that exceeds a limit is killed and replaced.
+    """
+
+    def __init__(self, config, size):
+        self.cpu_seconds = config["PARSER_SANDBOX_CPU_SECONDS"]
+        self.timeout = config["PARSER_SANDBOX_TIMEOUT"]
+        max_rss_bytes = config["PARSER_SANDBOX_MAX_RSS_MB"] * 1024 * 1024
+
+        self.workers = queue.Queue()
+        for _ in range(size):
+            self.workers.put(ParserWorker(max_rss_bytes))
+
+    def parse(self, file_path, file_type, config):
+        """
+        Parse a document in the next free worker.
+
+        Args:
+            file_path (str): Path to the document file
+            file_type (str): Type of the document (pdf, docx, txt, etc.)
+            config (dict): Configuration settings
+
+        Returns:
+            list: Segments as yielded by iter_document_segments
+
+        Raises:
+            ParserAbortedError: If the document exceeded its limits
+        """
+        # Limits apply to a single process, so keep PDF extraction in the worker itself
+        worker_config = dict(config, PDF_PARALLEL_WORKERS=1)
+
+        worker = self.workers.get()
+        try:
+            return worker.parse(file_path, file_type, worker_config, self.cpu_seconds, self.timeout)
+        finally:
+            self.workers.put(worker)
+
+    def shutdown(self):
+        """Kill all idle workers."""
+        while True:
+            try:
+                worker = self.workers.get_nowait()
+            except queue.Empty:
+                break
+            worker.kill()
+
+def _worker_main(conn, max_address_space):
+    """Serve parse requests from the parent until the pipe is closed."""
+    if max_address_space:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (max_address_space, hard))
+
+    while True:
+        try:
+            file_path, file_type, config, cpu_seconds = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        # RLIMIT_CPU counts the whole process lifetime, so extend it from current usage;
+        # SIGXCPU terminates the worker once this document uses up its share
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+        try:
+            conn.send(('ok', list(iter_document_segments(file_path, file_type, config))))
+        except MemoryError:
+            conn.send(('aborted', "Parsing exceeded the memory limit"))
+        except Exception as e:
+            conn.send(('error', f"Error parsing document: {e}"))
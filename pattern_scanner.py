@@ -0,0 +1,279 @@
+import re
+import heapq
+import functools
+import logging
+from match_resolver import resolve_overlaps
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+# Characters stripped from a numeric match before converting it to a float
+NON_NUMERIC_PATTERN = re.compile(r'[^\d.]')
+
+# Character classes the first character of a pattern can be taken from
+FIRST_CHAR_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: r'\d',
+    sre_parse.CATEGORY_WORD: r'\w',
+    sre_parse.CATEGORY_SPACE: r'\s',
+}
+
+# Dates are more specific than any numeric pattern
+MATCH_TYPE_RANKS = {'date': 0, 'number': 1}
+
+# Characters of surrounding text included on each side of a match's context
+MATCH_CONTEXT_CHARS = 50
+
+class TextMatch:
+    """
+    A date or number match stored as offsets into the text it was found in.
+
+    The matched string and its context are only sliced out of the text when
+    they are used. The fields can also be read by the keys of the match
+    dictionaries used elsewhere (date_str, num_str, num_value,
+    start_position, end_position, context).
+    """
+    __slots__ = ('source', 'start', 'end', 'offset', 'match_type', 'num_value')
+
+    _KEYS = {
+        'date_str': 'text',
+        'num_str': 'text',
+        'num_value': 'num_value',
+        'start_position': 'start_position',
+        'end_position': 'end_position',
+        'context': 'context',
+    }
+
+    def __init__(self, source, start, end, match_type, offset=0, num_value=None):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.offset = offset  # Position of source[0] in the whole text
+        self.match_type = match_type
+        self.num_value = num_value
+
+    @property
+    def text(self):
+        return self.source[self.start:self.end]
+
+    @property
+    def start_position(self):
+        return self.offset + self.start
+
+    @property
+    def end_position(self):
+        return self.offset + self.end
+
+    @property
+    def context(self):
+        return self.source[max(0, self.start - MATCH_CONTEXT_CHARS):self.end + MATCH_CONTEXT_CHARS]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """Return the match as a dictionary with its context materialized."""
+        text_key = 'date_str' if self.match_type == 'date' else 'num_str'
+        match = {text_key: self.text}
+        if self.match_type == 'number':
+            match['num_value'] = self.num_value
+        match.update({
+            'start_position': self.start_position,
+            'end_position': self.end_position,
+            'context': self.context,
+        })
+        return match
+
+    def __repr__(self):
+        return f"TextMatch({self.match_type!r}, {self.text!r}, {self.start_position}, {self.end_position})"
+
+class PatternScanner:
+    """
+    Scanner over the configured date and numeric patterns.
+
+    The patterns of each type are merged into one compiled alternation with
+    a named group per pattern, so the text is scanned once per type rather
+    than once per pattern. The two match streams are merged in positional
+    order and overlapping matches are resolved to the most specific one:
+    dates win over numbers, earlier listed patterns over later ones
+    (patterns are listed most specific first, e.g. currency before plain
+    numbers), and longer matches over shorter ones.
+    """
+
+    def __init__(self, date_patterns, numeric_patterns):
+        self.group_types = {}
+        self.patterns = []
+        for match_type, patterns in (('date', date_patterns), ('number', numeric_patterns)):
+            alternatives = []
+            for index, pattern in enumerate(patterns):
+                group_name = f"{match_type}_{index}"
+                alternatives.append(f"(?P<{group_name}>{pattern})")
+                self.group_types[group_name] = (match_type, index)
+            if alternatives:
+                # A lookahead on the possible first characters lets the regex engine
+                # skip ahead to candidate positions instead of trying every alternative
+                first_chars = first_char_class(patterns)
+                prefilter = f"(?={first_chars})" if first_chars else ""
+                self.patterns.append(re.compile(prefilter + "(?:" + "|".join(alternatives) + ")"))
+
+        logger.debug(f"Compiled pattern scanner with {len(self.group_types)} patterns")
+
+    def scan(self, text):
+        """
+        Scan text for date and numeric matches.
+
+        Args:
+            text (str): Text to search in
+
+        Yields:
+            tuple: (start, end, match_type, pattern_index) in
+                positional order, where match_type is 'date' or 'number'
+        """
+        return resolve_overlaps(self.candidates(text), match_priority)
+
+    def candidates(self, text, pos=0):
+        """
+        Yield the matches of every pattern type, including overlapping ones.
+
+        Args:
+            text (str): Text to search in
+            pos (int): Position to start searching from; characters before it
+                are still seen by lookbehinds and word boundaries
+
+        Yields:
+            tuple: (start, end, match_type, pattern_index) in
+                order of start position
+        """
+        return heapq.merge(*(self._iter_matches(pattern, text, pos) for pattern in self.patterns))
+
+    def _iter_matches(self, pattern, text, pos):
+        group_types = self.group_types
+        for match in pattern.finditer(text, pos):
+            match_type, pattern_index = group_types[match.lastgroup]
+            start, end = match.span()
+            yield start, end, match_type, pattern_index
+
+def first_char_class(patterns):
+    """
+    Work out which characters matches of a set of patterns can start with.
+
+    Args:
+        patterns (iterable): Regex patterns
+
+    Returns:
+        str: A character class matching every possible first character, or
+            None if it cannot be determined (e.g. a pattern can match the
+            empty string or starts with '.')
+    """
+    items = set()
+    for pattern in patterns:
+        try:
+            parsed = sre_parse.parse(pattern)
+        except re.error:
+            return None
+        if parsed.state.flags & re.IGNORECASE:
+            return None
+        pattern_items = _first_items(list(parsed))
+        if pattern_items is None:
+            return None
+        items.update(pattern_items)
+    return "[" + "".join(sorted(items)) + "]" if items else None
+
+def _first_items(sequence):
+    """Return character class items for the first character of a parsed sequence."""
+    for op, av in sequence:
+        if op is sre_parse.AT:
+            # Anchors and word boundaries do not consume a character
+            continue
+        if op is sre_parse.LITERAL:
+            return {re.escape(chr(av))}
+        if op is sre_parse.IN:
+            items = set()
+            for item_op, item_av in av:
+                if item_op is sre_parse.LITERAL:
+                    items.add(re.escape(chr(item_av)))
+                elif item_op is sre_parse.RANGE:
+                    items.add(re.escape(chr(item_av[0])) + "-" + re.escape(chr(item_av[1])))
+                elif item_op is sre_parse.CATEGORY and item_av in FIRST_CHAR_CATEGORIES:
+                    items.add(FIRST_CHAR_CATEGORIES[item_av])
+                else:
+                    return None
+            return items
+        if op is sre_parse.SUBPATTERN:
+            return _first_items(list(av[-1]))
+        if op is sre_parse.BRANCH:
+            items = set()
+            for branch in av[1]:
+                branch_items = _first_items(list(branch))
+                if branch_items is None:
+                    return None
+                items.update(branch_items)
+            return items
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] > 0:
+            return _first_items(list(av[2]))
+        return None
+    return None
+
+def match_priority(candidate):
+    """Sort key ranking overlapping scanner candidates, most specific first."""
+    start, end, match_type, pattern_index = candidate[:4]
+    return MATCH_TYPE_RANKS[match_type], pattern_index, start - end, start
+
+def get_scanner(config):
+    """
+    Return the scanner for the patterns in a configuration.
+
+    Scanners are compiled once and reused for every document analyzed with
+    the same patterns.
+
+    Args:
+        config (dict): Configuration settings
+
+    Returns:
+        PatternScanner: Scanner for DATE_FORMAT_PATTERNS and NUMERIC_PATTERNS
+    """
+    return build_scanner(tuple(config["DATE_FORMAT_PATTERNS"]), tuple(config["NUMERIC_PATTERNS"]))
+
+@functools.lru_cache(maxsize=16)
+def build_scanner(date_patterns, numeric_patterns):
+    """
+    Return a cached scanner for the given patterns.
+
+    Args:
+        date_patterns (tuple): Regex patterns for dates, most specific first
+        numeric_patterns (tuple): Regex patterns for numbers, most specific first
+
+    Returns:
+        PatternScanner: The compiled scanner
+    """
+    return PatternScanner(date_patterns, numeric_patterns)
+
+def parse_number(num_str):
+    """
+    Convert a numeric match to a float.
+
+    Args:
+        num_str (str): Matched text, possibly with currency signs or separators
+
+    Returns:
+        float: The numeric value, or None if it cannot be converted
+    """
+    clean_num = NON_NUMERIC_PATTERN.sub('', num_str)
+    if not clean_num:
+        return None
+    try:
+        return float(clean_num)
+    except ValueError:
+        return None
@@ -1,12 +1,17 @@
 import os
+import json
 import threading
 import logging
 from datetime import datetime
 from app import db, app
 from models import Document, ProcessingJob, Anomaly
-from document_parser import parse_document
+from document_parser import iter_document_segments, find_segment, SEGMENT_SEPARATOR
 from anomaly_detector import detect_anomalies
+from revision_diff import reanalyze_revision
 from database import store_document_in_weaviate
+from extraction_cache import ExtractionCache
+from text_normalizer import OffsetMap
+from parser_sandbox import ParserSandbox, ParserAbortedError
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +21,19 @@ class DocumentProcessor:
     def __init__(self, config):
         self.config = config
         self.processing_queue = []
-        self.processing_lock = threading.Lock()
+        # Re-entrant because _process_queue is called with the lock already held
+        self.processing_lock = threading.RLock()
         self.max_threads = config["PROCESSING_THREADS"]
         self.active_threads = 0
+        self.extraction_cache = None
+        if config.get("EXTRACTION_CACHE_ENABLED", False):
+            self.extraction_cache = ExtractionCache(
+                config["EXTRACTION_CACHE_DIR"],
+                config["EXTRACTION_CACHE_MAX_BYTES"]
+            )
+        self.parser_sandbox = None
+        if config.get("PARSER_SANDBOX_ENABLED", False):
+            self.parser_sandbox = ParserSandbox(config, self.max_threads)
     
     def add_document(self, document_id):
         """Add a document to the processing queue."""
@@ -74,11 +89,20 @@ class DocumentProcessor:
                 logger.info(f"Processing document: {document.filename}")
                 
                 # Step 1: Parse the document to extract text
-                text_content = parse_document(document.original_path, document.file_type)
+                text_content, pages = self._extract_text(document)
                 document.content_length = len(text_content) if text_content else 0
                 
-                # Step 2: Detect anomalies
-                anomalies = detect_anomalies(text_content, self.config)
+                # Step 2: Detect anomalies, only in the changed text if this is a
+                # revision of a processed document
+                detection_stats = {}
+                anomalies = self._reanalyze_revision(document, text_content, detection_stats)
+                if anomalies is None:
+                    anomalies = detect_anomalies(text_content, self.config, detection_stats)
+                job.chunks_skipped = detection_stats.get('chunks_skipped', 0)
+                job.tokens_saved = detection_stats.get('tokens_saved', 0)
+                chunks_unanalyzed = detection_stats.get('chunks_unanalyzed', 0)
+                job.detector_stats = json.dumps(detection_stats.get('detectors', []))
+                self._assign_source_positions(anomalies, pages)
                 
                 # Step 3: Store anomalies in the database
                 for anomaly_data in anomalies:
@@ -89,7 +113,11 @@ class DocumentProcessor:
                         description=anomaly_data['description'],
                         context=anomaly_data.get('context'),
                         start_position=anomaly_data.get('start_position'),
-                        end_position=anomaly_data.get('end_position')
+                        end_position=anomaly_data.get('end_position'),
+                        page_number=anomaly_data.get('page_number'),
+                        source_start_position=anomaly_data.get('source_start_position'),
+                        source_end_position=anomaly_data.get('source_end_position'),
+                        detector=anomaly_data.get('detector')
                     )
                     db.session.add(anomaly)
                 
@@ -106,8 +134,14 @@ class DocumentProcessor:
                 # Mark document as processed
                 document.processed = True
                 
-                # Update job as completed
-                job.status = 'completed'
+                # Update job as completed, or partial if the model was unavailable
+                # or out of time for some chunks
+                if chunks_unanalyzed:
+                    job.status = 'partial'
+                    job.error_message = (f"AI detection skipped {chunks_unanalyzed} text chunks because the model "
+                                         f"service was unavailable or the time budget ran out")
+                else:
+                    job.status = 'completed'
                 job.end_time = datetime.utcnow()
                 db.session.commit()
                 
@@ -120,7 +154,7 @@ class DocumentProcessor:
                 # Update job status
                 job = ProcessingJob.query.get(job_id)
                 if job:
-                    job.status = 'failed'
+                    job.status = 'aborted' if isinstance(e, ParserAbortedError) else 'failed'
                     job.error_message = str(e)
                     job.end_time = datetime.utcnow()
                     db.session.commit()
@@ -131,6 +165,155 @@ class DocumentProcessor:
                 self.active_threads -= 1
                 self._process_queue()
 
+    def _extract_text(self, document):
+        """
+        Extract the text of a document page by page.
+        
+        Documents already seen with identical content are served from the
+        extraction cache without being parsed again. With the parser sandbox
+        enabled, parsing runs in a resource-limited worker process.
+        
+        Args:
+            document (Document): Document model object
+            
+        Returns:
+            tuple: (text_content, pages) where pages holds the page number,
+                offsets and offset map of each extracted page, without its text
+                
+        Raises:
+            ParserAbortedError: If the sandboxed parser exceeded its limits
+        """
+        texts = []
+        pages = []
+        cache_key = None
+        try:
+            if self.extraction_cache:
+                cache_key = self.extraction_cache.key_for(document.original_path, self.config)
+                cached = self.extraction_cache.get(cache_key)
+                if cached:
+                    logger.debug(f"Extraction cache hit for {document.filename}")
+                    return cached['text'], [self._page_from_cache(page) for page in cached['pages']]
+            
+            if self.parser_sandbox:
+                segments = self.parser_sandbox.parse(document.original_path, document.file_type, self.config)
+            else:
+                segments = iter_document_segments(document.original_path, document.file_type, self.config)
+            
+            for segment in segments:
+                texts.append(segment['text'])
+                pages.append({
+                    'page_number': segment['page_number'],
+                    'start_offset': segment['start_offset'],
+                    'end_offset': segment['end_offset'],
+                    'offset_map': segment['offset_map']
+                })
+        except ParserAbortedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error parsing document {document.filename}: {e}", exc_info=True)
+            return None, []
+        
+        if not texts:
+            return None, []
+        
+        logger.debug(f"Extracted {len(pages)} pages from {document.filename}")
+        text_content = SEGMENT_SEPARATOR.join(texts)
+        if cache_key:
+            self.extraction_cache.put(cache_key, {
+                'text': text_content,
+                'pages': [self._page_to_cache(page) for page in pages]
+            })
+        return text_content, pages
+    
+    def _reanalyze_revision(self, document, text_content, detection_stats):
+        """
+        Detect anomalies in a revision by re-analyzing only what changed since its previous version.
+        
+        Args:
+            document (Document): Document model object
+            text_content (str): Extracted text of the document
+            detection_stats (dict): Receives processing statistics
+            
+        Returns:
+            list: Anomalies of the document, or None if it has to be analyzed
+                in full (no usable or parsable previous version, or too much changed)
+        """
+        if not self.config.get("REVISION_DIFF_ENABLED", False) or not text_content:
+            return None
+        previous = document.previous_version
+        if previous is None or not previous.processed:
+            return None
+        
+        # Anomalies of a partial or failed run are incomplete and cannot be carried over
+        previous_job = ProcessingJob.query.filter_by(document_id=previous.id).order_by(ProcessingJob.id.desc()).first()
+        if previous_job is None or previous_job.status != 'completed':
+            return None
+        
+        # A previous version that can no longer be parsed only costs the shortcut
+        try:
+            previous_text, _ = self._extract_text(previous)
+        except Exception as e:
+            logger.warning(f"Could not re-parse previous version {previous.id} of {document.filename}, "
+                           f"analyzing it in full: {e}")
+            return None
+        if not previous_text:
+            return None
+        
+        previous_anomalies = [{
+            'type': anomaly.anomaly_type,
+            'severity': anomaly.severity,
+            'description': anomaly.description,
+            'context': anomaly.context,
+            'start_position': anomaly.start_position,
+            'end_position': anomaly.end_position,
+            'detector': anomaly.detector
+        } for anomaly in previous.anomalies]
+        
+        logger.info(f"Re-analyzing {document.filename} as a revision of document {previous.id}")
+        return reanalyze_revision(previous_text, previous_anomalies, text_content, self.config, detection_stats)
+    
+    def _assign_source_positions(self, anomalies, pages):
+        """
+        Annotate anomalies with their page and position in the raw text of their segment.
+        
+        Segments are pages for paginated formats; others have no page number
+        but still get source positions.
+        
+        Args:
+            anomalies (list): Anomaly dictionaries with positions in the cleaned text
+            pages (list): Page index returned by _extract_text
+        """
+        for anomaly in anomalies:
+            start_pos = anomaly.get('start_position')
+            end_pos = anomaly.get('end_position')
+            if not isinstance(start_pos, int):
+                continue
+            page = find_segment(pages, start_pos)
+            if not page:
+                continue
+            if page['page_number'] is not None:
+                anomaly['page_number'] = page['page_number']
+            
+            offset_map = page['offset_map']
+            if offset_map is not None and isinstance(end_pos, int):
+                # Anomalies spanning pages are clipped to the page they start on
+                page_end = min(end_pos, page['end_offset']) - page['start_offset']
+                source_start, source_end = offset_map.to_source_span(start_pos - page['start_offset'], page_end)
+                anomaly['source_start_position'] = source_start
+                anomaly['source_end_position'] = source_end
+    
+    @staticmethod
+    def _page_to_cache(page):
+        """Convert a page index entry to its JSON form for the extraction cache."""
+        offset_map = page['offset_map']
+        return dict(page, offset_map=offset_map.to_list() if offset_map is not None else None)
+    
+    @staticmethod
+    def _page_from_cache(page):
+        """Rebuild a page index entry stored by _page_to_cache."""
+        offset_map = page.get('offset_map')
+        return dict(page, offset_map=OffsetMap.from_list(offset_map) if offset_map is not None else None)
+
 # Initialize the document processor with the app context
 document_processor = None
 
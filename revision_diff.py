@@ -0,0 +1,374 @@
+import re
+import bisect
+import hashlib
+import logging
+from collections import Counter
+from difflib import SequenceMatcher
+from anomaly_detector import AI_PLACEHOLDER_DESCRIPTION, detect_anomalies
+from detectors import detector_scopes
+from text_chunker import CLAUSE_BOUNDARY_PATTERN
+from text_normalizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Words per shingle when a context is placed by the runs of words it shares with the text
+CONTEXT_SHINGLE_WORDS = 3
+
+# Words a context may gain or lose against the text and still have its shingles agree
+CONTEXT_SHINGLE_SLACK = 2
+
+# Share of a context's shingles that must agree on its place in the text
+CONTEXT_MIN_SHARED_FRACTION = 0.6
+
+def clause_hashes(text):
+    """
+    Split text into clauses and hash each one.
+
+    Clause boundaries depend only on the text around them, so an edit
+    changes the clauses it touches and leaves the others with the same
+    hashes.
+
+    Args:
+        text (str): Text to split
+
+    Returns:
+        tuple: (spans, hashes) with the (start, end) of each clause and the
+            digest of its text, in text order
+    """
+    spans = []
+    start = 0
+    for boundary in CLAUSE_BOUNDARY_PATTERN.finditer(text):
+        if boundary.end() > start:
+            spans.append((start, boundary.end()))
+        start = boundary.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+
+    hashes = [
+        hashlib.blake2b(text[start:end].encode('utf-8', errors='surrogatepass'), digest_size=8).digest()
+        for start, end in spans
+    ]
+    return spans, hashes
+
+def diff_revisions(old_text, new_text):
+    """
+    Compare two versions of a text clause by clause.
+
+    Args:
+        old_text (str): Text of the previous version
+        new_text (str): Text of the new version
+
+    Returns:
+        tuple: (unchanged, changed, new_spans) where unchanged holds
+            (old_start, old_end, new_start) for each run of identical
+            clauses, changed holds the (start, end) of each changed run in
+            the new text (empty for pure deletions), and new_spans are the
+            clause spans of the new text
+    """
+    old_spans, old_hashes = clause_hashes(old_text)
+    new_spans, new_hashes = clause_hashes(new_text)
+    matcher = SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+
+    unchanged = []
+    changed = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            unchanged.append((old_spans[i1][0], old_spans[i2 - 1][1], new_spans[j1][0]))
+        else:
+            start = new_spans[j1][0] if j1 < len(new_spans) else len(new_text)
+            end = new_spans[j2 - 1][1] if j2 > j1 else start
+            changed.append((start, end))
+    return unchanged, changed, new_spans
+
+def reanalyze_revision(old_text, old_anomalies, new_text, config, stats=None):
+    """
+    Detect anomalies in a new version of a document, reusing the previous version's results.
+
+    Anomalies of local detectors within REVISION_CONTEXT_CHARS of an edit
+    may differ from the previous version's, so that text, widened to whole
+    clauses, is analyzed again. The detectors run on it with twice as much
+    text again on each side, so they see what they would see in the whole
+    text, and their anomalies reaching into it are kept. Previous anomalies
+    lying entirely in unchanged text outside it are carried over with their
+    positions moved to the new text; anomalies without positions, as the
+    model reports them, are placed by finding their context with a
+    ContextFinder. Detectors of document scope, and those with anomalies
+    that cannot be placed, run on the whole new text.
+
+    The result matches a full run as long as REVISION_CONTEXT_CHARS is
+    larger than the distance over which a local detector relates matches.
+
+    Args:
+        old_text (str): Text of the previous version
+        old_anomalies (list): Anomaly dictionaries of the previous version
+        new_text (str): Text of the new version
+        config (dict): Configuration settings
+        stats (dict): Optional dictionary that receives processing
+            statistics, as with detect_anomalies, plus changed_chars,
+            reanalyzed_chars, reused_anomalies, unplaced_anomalies and
+            whole_text_fallbacks (local detectors run on the whole text
+            because some of their anomalies could not be placed)
+
+    Returns:
+        list: Anomalies of the new version in text order, or None if too much
+            of the text changed for re-analysis to pay off, or the detectors
+            of the previous anomalies are not known
+    """
+    scopes = detector_scopes()
+    if any(anomaly.get('detector') not in scopes for anomaly in old_anomalies):
+        logger.info("Previous version has anomalies of unknown detectors; analyzing the revision in full")
+        return None
+
+    unchanged, changed, new_spans = diff_revisions(old_text, new_text)
+    margin = config.get("REVISION_CONTEXT_CHARS", 1000)
+    regions = _detection_regions(changed, new_spans, len(new_text), margin)
+    windows = _detection_regions(regions, new_spans, len(new_text), 2 * margin)
+
+    changed_chars = sum(end - start for start, end in changed)
+    reanalyzed_chars = sum(end - start for start, end in windows)
+    if reanalyzed_chars > config.get("REVISION_MAX_CHANGED_FRACTION", 0.5) * len(new_text):
+        logger.info(f"Revision needs {reanalyzed_chars} of {len(new_text)} characters re-analyzed; analyzing it in full")
+        return None
+
+    # Decide for each previous anomaly of a local detector whether it still holds
+    whole_text = {name for name, scope in scopes.items() if scope == 'document'}
+    old_finder = ContextFinder(old_text)
+    unplaced = []
+    placed = []
+    old_placeholders = []
+    for anomaly in old_anomalies:
+        if anomaly.get('description') == AI_PLACEHOLDER_DESCRIPTION:
+            old_placeholders.append(anomaly)
+        elif scopes[anomaly['detector']] == 'local':
+            position = _carried_position(anomaly, old_finder, unchanged, regions)
+            if position is None:
+                # Only a run over the whole text can tell whether it still holds
+                unplaced.append(anomaly)
+                whole_text.add(anomaly['detector'])
+            elif position:
+                placed.append((anomaly, position))
+
+    anomalies = [
+        dict(anomaly, start_position=position[0], end_position=position[1]) if position[0] is not None else dict(anomaly)
+        for anomaly, position in placed
+        if anomaly['detector'] not in whole_text
+    ]
+    reused = len(anomalies)
+
+    reports = {}
+    new_placeholders = []
+    runs = [(0, len(new_text), whole_text)] if whole_text else []
+    runs += [(start, end, set(scopes) - whole_text) for start, end in windows]
+    for start, end, names in runs:
+        run_stats = {}
+        finder = ContextFinder(new_text[start:end])
+        for anomaly in detect_anomalies(finder.text, config, run_stats, names=names):
+            if anomaly.get('description') == AI_PLACEHOLDER_DESCRIPTION:
+                new_placeholders.append(anomaly)
+                continue
+            if anomaly['detector'] not in whole_text and not _in_regions(anomaly, finder, start, regions):
+                continue
+            if isinstance(anomaly.get('start_position'), int):
+                anomaly['start_position'] += start
+            if isinstance(anomaly.get('end_position'), int):
+                anomaly['end_position'] += start
+            anomalies.append(anomaly)
+        _merge_run_stats(run_stats, stats, reports)
+
+    # The development mode placeholder stands for the whole document: report it
+    # once, from this run if its detector ran, else from the previous version
+    disabled = set(config.get("DISABLED_DETECTORS", []))
+    placeholders = new_placeholders or [
+        anomaly for anomaly in old_placeholders
+        if anomaly['detector'] not in reports and anomaly['detector'] not in disabled
+    ]
+    if placeholders:
+        anomalies.append(dict(placeholders[0], start_position=0, end_position=min(100, len(new_text))))
+
+    logger.info(f"Revision re-analysis: {len(windows)} windows ({reanalyzed_chars} of {len(new_text)} characters, "
+                f"{changed_chars} changed), {reused} anomalies carried over, {sorted(whole_text)} run on the whole text")
+    fallbacks = {anomaly['detector'] for anomaly in unplaced}
+    if unplaced:
+        logger.warning(f"Could not place {len(unplaced)} anomalies of the previous version; "
+                       f"ran {sorted(fallbacks)} on the whole text")
+    if stats is not None:
+        stats['changed_chars'] = changed_chars
+        stats['reanalyzed_chars'] = reanalyzed_chars
+        stats['reused_anomalies'] = reused
+        stats['unplaced_anomalies'] = len(unplaced)
+        stats['whole_text_fallbacks'] = len(fallbacks)
+        stats['detectors'] = list(reports.values())
+
+    anomalies.sort(key=lambda anomaly: anomaly.get('start_position') or 0)
+    return anomalies
+
+def _carried_position(anomaly, old_finder, unchanged, regions):
+    """
+    Find where an anomaly of the previous version lies in the new text.
+
+    Args:
+        anomaly (dict): Anomaly of the previous version
+        old_finder (ContextFinder): Finder over the text of the previous version
+        unchanged (list): Unchanged runs from diff_revisions
+        regions (list): (start, end) of the regions analyzed again
+
+    Returns:
+        tuple: (start, end) in the new text if the anomaly lies in unchanged
+            text outside the regions, (None, None) for an anomaly without
+            positions whose context does; False if it lies in edited or
+            re-analyzed text, and None if it cannot be placed
+    """
+    start_pos, end_pos = anomaly.get('start_position'), anomaly.get('end_position')
+    positioned = isinstance(start_pos, int) and isinstance(end_pos, int)
+    if not positioned:
+        span = old_finder.find(anomaly.get('context'))
+        if span is None:
+            return None
+        start_pos, end_pos = span
+
+    run = bisect.bisect_right([old_start for old_start, _, _ in unchanged], start_pos) - 1
+    if run < 0 or end_pos > unchanged[run][1]:
+        return False
+    shift = unchanged[run][2] - unchanged[run][0]
+    if _overlaps_regions(start_pos + shift, end_pos + shift, regions):
+        return False
+    return (start_pos + shift, end_pos + shift) if positioned else (None, None)
+
+def _in_regions(anomaly, finder, offset, regions):
+    """
+    Return True if an anomaly found in a window of the new text reaches into the regions.
+
+    Anomalies without positions count by where their context lies, and are
+    kept if it cannot be found.
+    """
+    start_pos, end_pos = anomaly.get('start_position'), anomaly.get('end_position')
+    if not (isinstance(start_pos, int) and isinstance(end_pos, int)):
+        span = finder.find(anomaly.get('context'))
+        if span is None:
+            return True
+        start_pos, end_pos = span
+    return _overlaps_regions(start_pos + offset, end_pos + offset, regions)
+
+class ContextFinder:
+    """
+    Locate the context of an anomaly in a text, tolerating the small changes a model makes when quoting.
+
+    A context is looked up verbatim first, then with whitespace, punctuation
+    noise and case normalized as normalize_text does, and finally by the
+    runs of CONTEXT_SHINGLE_WORDS words it shares with the text: the
+    alignment most of them agree on, give or take CONTEXT_SHINGLE_SLACK
+    words, wins if at least CONTEXT_MIN_SHARED_FRACTION of them do.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.normalized = None
+
+    def find(self, context):
+        """
+        Find where a context lies in the text.
+
+        Args:
+            context (str): Context reported with an anomaly
+
+        Returns:
+            tuple: (start, end) of the context in the text, or None if it
+                cannot be found
+        """
+        context = (context or "").strip()
+        if not context:
+            return None
+        found = self.text.find(context)
+        if found >= 0:
+            return found, found + len(context)
+
+        if self.normalized is None:
+            self._index()
+        context = _normalize_context(context)
+        if not context:
+            return None
+        found = self.normalized.find(context)
+        if found >= 0:
+            return self.offset_map.to_source_span(found, found + len(context))
+        return self._find_shingles(context.split(' '))
+
+    def _index(self):
+        """Normalize the text and index its word shingles."""
+        normalized, self.offset_map = normalize_text(self.text)
+        self.normalized = _lower(normalized)
+        self.words = [match.span() for match in re.finditer(r'\S+', self.normalized)]
+        words = [_shingle_word(self.normalized[start:end]) for start, end in self.words]
+        self.shingles = {}
+        for index in range(len(words) - CONTEXT_SHINGLE_WORDS + 1):
+            self.shingles.setdefault(tuple(words[index:index + CONTEXT_SHINGLE_WORDS]), []).append(index)
+
+    def _find_shingles(self, words):
+        """Place a normalized context by the word shingles it shares with the text."""
+        count = len(words) - CONTEXT_SHINGLE_WORDS + 1
+        if count < 2:
+            return None
+        votes = Counter()
+        for index in range(count):
+            shingle = tuple(_shingle_word(word) for word in words[index:index + CONTEXT_SHINGLE_WORDS])
+            for position in self.shingles.get(shingle, ()):
+                votes[position - index] += 1
+        if not votes:
+            return None
+        # Words the model added or left out shift the alignment of the shingles after them
+        shared, first = max(
+            (sum(votes[offset + slack] for slack in range(-CONTEXT_SHINGLE_SLACK, CONTEXT_SHINGLE_SLACK + 1)), offset)
+            for offset in votes
+        )
+        if shared < CONTEXT_MIN_SHARED_FRACTION * count:
+            return None
+        start = self.words[max(0, first)][0]
+        end = self.words[min(len(self.words), first + len(words)) - 1][1]
+        return self.offset_map.to_source_span(start, end)
+
+def _normalize_context(context):
+    """Normalize a context like ContextFinder's text, without the ellipses and quotes around it."""
+    return _lower(normalize_text(context)[0]).strip(' .\'"')
+
+def _shingle_word(word):
+    return word.strip(".,;:!?()'\"")
+
+def _lower(text):
+    """Lowercase text unless that would change its length and break its offset map."""
+    lowered = text.lower()
+    return lowered if len(lowered) == len(text) else text
+
+def _overlaps_regions(start, end, regions):
+    """Return True if a span of the new text overlaps any of the regions."""
+    region = bisect.bisect_left(regions, (end,)) - 1
+    return region >= 0 and regions[region][1] > start
+
+def _detection_regions(changed, spans, text_length, margin):
+    """Widen changed runs by margin, snap them to clause boundaries and merge overlaps."""
+    starts = [start for start, _ in spans]
+    ends = [end for _, end in spans]
+
+    regions = []
+    for start, end in changed:
+        start = max(0, start - margin)
+        end = min(text_length, end + margin)
+        clause = bisect.bisect_right(starts, start) - 1
+        start = starts[clause] if clause >= 0 else 0
+        clause = bisect.bisect_left(ends, end)
+        end = ends[clause] if clause < len(ends) else text_length
+
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        elif end > start:
+            regions.append((start, end))
+    return regions
+
+def _merge_run_stats(run_stats, stats, reports):
+    """Add one run's statistics to the totals, summing detector reports by name."""
+    for report in run_stats.pop('detectors', []):
+        total = reports.setdefault(report['name'], dict(report, wall_time=0.0, matches=0, anomalies=0))
+        total['wall_time'] = round(total['wall_time'] + report['wall_time'], 4)
+        total['matches'] += report['matches']
+        total['anomalies'] += report['anomalies']
+    if stats is not None:
+        for key, value in run_stats.items():
+            stats[key] = stats.get(key, 0) + value
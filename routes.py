@@ -1,4 +1,5 @@
 import os
+import json
 import logging
 from flask import render_template, request, redirect, url_for, flash, jsonify, session
 from werkzeug.utils import secure_filename
@@ -6,6 +7,7 @@ from datetime import datetime
 from app import app, db
 from models import Document, Anomaly, ProcessingJob
 from processor import get_processor
+from shared_services import service_stats
 from database import get_document_by_id, search_documents
 
 logger = logging.getLogger(__name__)
@@ -58,6 +60,12 @@ def upload():
         
         uploaded_documents = []
         
+        # An explicit previous version applies to a single uploaded file
+        previous_version_id = request.form.get('previous_version_id', type=int)
+        if previous_version_id and (len(files) > 1 or not Document.query.get(previous_version_id)):
+            flash('Previous version ignored: it only applies to a single upload of an existing document', 'warning')
+            previous_version_id = None
+        
         for file in files:
             if file and allowed_file(file.filename):
                 # Secure the filename and create the file path
@@ -70,11 +78,21 @@ def upload():
                 # Save the file
                 file.save(file_path)
                 
+                # Link the document to the previous revision given in the form, or
+                # if enabled to the latest processed document of the same name
+                previous_version = None
+                if previous_version_id:
+                    previous_version = previous_version_id
+                elif app.config.get('REVISION_LINK_BY_FILENAME', False):
+                    latest = Document.query.filter_by(filename=filename, processed=True).order_by(Document.upload_date.desc()).first()
+                    previous_version = latest.id if latest else None
+                
                 # Create a database entry for the document
                 document = Document(
                     filename=filename,
                     original_path=file_path,
                     file_type=file_extension,
+                    previous_version_id=previous_version
                 )
                 db.session.add(document)
                 db.session.commit()
@@ -203,7 +221,11 @@ def document_status(doc_id):
         'document_id': doc_id,
         'filename': document.filename,
         'processed': document.processed,
+        'previous_version_id': document.previous_version_id,
         'job_status': processing_job.status if processing_job else 'unknown',
+        'chunks_skipped': processing_job.chunks_skipped if processing_job else None,
+        'tokens_saved': processing_job.tokens_saved if processing_job else None,
+        'detectors': json.loads(processing_job.detector_stats) if processing_job and processing_job.detector_stats else None,
         'error': processing_job.error_message if processing_job and processing_job.error_message else None
     }
     
@@ -240,6 +262,9 @@ def document_anomalies(doc_id):
         'context': a.context,
         'start_position': a.start_position,
         'end_position': a.end_position,
+        'page_number': a.page_number,
+        'source_start_position': a.source_start_position,
+        'source_end_position': a.source_end_position,
         'detected_at': a.detected_at.isoformat() if a.detected_at else None
     } for a in anomalies]
     
@@ -288,6 +313,12 @@ def health_check():
             'vllm_enabled': app.config.get('VLLM_ENABLED', False)
         }
         
+        if processor.extraction_cache:
+            status['extraction_cache'] = processor.extraction_cache.stats()
+        
+        # LLM batcher and cache, HTTP transport, vLLM breaker and detector totals
+        status.update(service_stats())
+        
         return jsonify(status)
     
     except Exception as e:
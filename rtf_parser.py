@@ -0,0 +1,180 @@
+import re
+import codecs
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the file at a time
+RTF_READ_SIZE = 64 * 1024
+
+# Control tokens ending this close to the end of the buffer are re-read with the
+# next block, since they may continue there (e.g. "\pa" + "r")
+RTF_CARRY = 48
+
+RTF_TOKEN_PATTERN = re.compile(
+    rb"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?"  # Control word with optional parameter
+    rb"|\\'([0-9a-fA-F]{2})"              # Hex-escaped byte
+    rb"|\\([^a-zA-Z])"                    # Control symbol
+    rb"|([{}])"                           # Group start or end
+    rb"|([^\\{}\r\n]+)"                   # Plain text
+    rb"|[\r\n]+"                          # Line breaks carry no meaning in RTF
+)
+
+# Destinations whose content is formatting or embedded data, not document text
+RTF_SKIPPED_DESTINATIONS = {
+    b'fonttbl', b'colortbl', b'stylesheet', b'info', b'pict', b'object', b'objdata',
+    b'header', b'headerl', b'headerr', b'headerf', b'footer', b'footerl', b'footerr',
+    b'footerf', b'fldinst', b'themedata', b'colorschememapping', b'datastore',
+    b'latentstyles', b'listtable', b'listoverridetable', b'rsidtbl', b'generator',
+    b'xmlnstbl', b'filetbl', b'revtbl', b'pgdsctbl', b'mmathPr', b'nonshppict',
+    b'bkmkstart', b'bkmkend', b'xe', b'tc',
+}
+
+# Control words that end the current paragraph
+RTF_PARAGRAPH_BREAKS = {b'par', b'sect', b'page', b'row'}
+
+# Control words that stand for a character
+RTF_CHARACTER_WORDS = {
+    b'line': "\n", b'tab': "\t", b'cell': " ", b'emspace': " ", b'enspace': " ",
+    b'qmspace': " ", b'emdash': "\u2014", b'endash': "\u2013", b'bullet': "\u2022",
+    b'lquote': "\u2018", b'rquote': "\u2019", b'ldblquote': "\u201c", b'rdblquote': "\u201d",
+}
+
+# Control symbols that stand for a character
+RTF_CHARACTER_SYMBOLS = {b'~': " ", b'_': "-", b'-': "", b'\\': "\\", b'{': "{", b'}': "}"}
+
+def iter_rtf_paragraphs(file_path):
+    """
+    Stream the plain-text paragraphs of an RTF file.
+
+    The file is tokenized block by block in a single pass. Font tables,
+    style sheets, pictures, headers and other non-text destinations are
+    skipped, and memory is bounded by the longest paragraph.
+
+    Args:
+        file_path (str): Path to the RTF file
+
+    Yields:
+        str: Raw text of each paragraph
+    """
+    encoding = 'cp1252'
+    skip = False
+    uc = 1
+    group_stack = []
+    fallback_skip = 0
+    bin_skip = 0
+    parts = []
+    pending_bytes = bytearray()
+
+    def flush_bytes():
+        if pending_bytes:
+            parts.append(pending_bytes.decode(encoding, errors='replace'))
+            pending_bytes.clear()
+
+    with open(file_path, 'rb') as file:
+        buffer = b''
+        eof = False
+        while not eof:
+            block = file.read(RTF_READ_SIZE)
+            eof = not block
+            buffer += block
+            pos = 0
+            size = len(buffer)
+
+            while pos < size:
+                if bin_skip:
+                    skipped = min(bin_skip, size - pos)
+                    pos += skipped
+                    bin_skip -= skipped
+                    continue
+
+                match = RTF_TOKEN_PATTERN.match(buffer, pos)
+                if match is None:
+                    # A lone trailing backslash; wait for more data or drop it at the end
+                    if not eof:
+                        break
+                    pos += 1
+                    continue
+                if match.lastindex != 6 and not eof and match.end() > size - RTF_CARRY:
+                    break
+                pos = match.end()
+
+                word, param, hex_byte, symbol, brace, text = match.groups()
+
+                if text is not None:
+                    if fallback_skip:
+                        dropped = min(fallback_skip, len(text))
+                        fallback_skip -= dropped
+                        text = text[dropped:]
+                    if not skip and text:
+                        pending_bytes.extend(text)
+
+                elif brace is not None:
+                    if brace == b'{':
+                        group_stack.append((skip, uc))
+                    elif group_stack:
+                        skip, uc = group_stack.pop()
+                    fallback_skip = 0
+
+                elif hex_byte is not None:
+                    if fallback_skip:
+                        fallback_skip -= 1
+                    elif not skip:
+                        pending_bytes.append(int(hex_byte, 16))
+
+                elif symbol is not None:
+                    if symbol == b'*':
+                        skip = True
+                    elif fallback_skip:
+                        fallback_skip -= 1
+                    elif not skip and symbol in RTF_CHARACTER_SYMBOLS:
+                        flush_bytes()
+                        parts.append(RTF_CHARACTER_SYMBOLS[symbol])
+
+                else:
+                    number = int(param) if param is not None else None
+                    fallback_skip = 0
+                    if word == b'bin':
+                        bin_skip = number or 0
+                    elif word in RTF_SKIPPED_DESTINATIONS:
+                        skip = True
+                    elif word == b'ansicpg' and number:
+                        encoding = _codepage_encoding(number, encoding)
+                    elif word == b'uc' and number is not None:
+                        uc = number
+                    elif skip:
+                        continue
+                    elif word == b'u' and number is not None:
+                        flush_bytes()
+                        parts.append(chr(number + 65536 if number < 0 else number))
+                        fallback_skip = uc
+                    elif word in RTF_CHARACTER_WORDS:
+                        flush_bytes()
+                        parts.append(RTF_CHARACTER_WORDS[word])
+                    elif word in RTF_PARAGRAPH_BREAKS:
+                        flush_bytes()
+                        yield _join_parts(parts)
+                        parts = []
+
+            buffer = buffer[pos:]
+
+    flush_bytes()
+    if parts:
+        yield _join_parts(parts)
+
+def _codepage_encoding(codepage, default):
+    """Return the Python codec for an RTF \\ansicpg value."""
+    name = f"cp{codepage}"
+    try:
+        codecs.lookup(name)
+        return name
+    except LookupError:
+        logger.warning(f"Unknown RTF code page {codepage}, using {default}")
+        return default
+
+def _join_parts(parts):
+    """Join paragraph pieces, recombining UTF-16 surrogate pairs from \\u escapes."""
+    text = "".join(parts)
+    if any('\ud800' <= char <= '\udfff' for char in text):
+        text = text.encode('utf-16', 'surrogatepass').decode('utf-16', errors='replace')
+    return text
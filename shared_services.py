@@ -0,0 +1,47 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Objects shared by all documents processed in this process, by name
+services = {}
+
+# Re-entrant, since creating one service may get another (the batcher uses the transport)
+services_lock = threading.RLock()
+
+def get_service(name, factory):
+    """
+    Return the process-wide object registered under a name, creating it on first use.
+
+    Args:
+        name (str): Name of the object, also its key in service_stats()
+        factory (callable): Called without arguments to create the object
+
+    Returns:
+        object: The shared object
+    """
+    with services_lock:
+        service = services.get(name)
+        if service is None:
+            service = services[name] = factory()
+            logger.debug(f"Created shared service {name}")
+        return service
+
+def discard_service(name):
+    """
+    Forget a shared object, so the next get_service call creates a new one.
+
+    Args:
+        name (str): Name of the object
+
+    Returns:
+        object: The discarded object, or None if there was none
+    """
+    with services_lock:
+        return services.pop(name, None)
+
+def service_stats():
+    """Return the stats() of every shared object created so far that has them, by name."""
+    with services_lock:
+        created = list(services.items())
+    return {name: service.stats() for name, service in created if hasattr(service, 'stats')}
@@ -41,7 +41,9 @@ function refreshDocumentStatus(documentId, interval = 5000) {
             .then(data => {
                 // Update status display
                 if (data.processed) {
-                    statusElement.innerHTML = '<span class="badge bg-success">Processed</span>';
+                    statusElement.innerHTML = data.job_status === 'partial'
+                        ? '<span class="badge bg-warning text-dark">Partially Processed</span>'
+                        : '<span class="badge bg-success">Processed</span>';
                     statusIcon.className = 'status-icon status-completed';
                     // Stop checking if processing is complete
                     clearInterval(statusCheckInterval);
@@ -55,8 +57,9 @@ function refreshDocumentStatus(documentId, interval = 5000) {
                         if (processingInfoElement) {
                             processingInfoElement.classList.remove('d-none');
                         }
-                    } else if (data.job_status === 'failed') {
-                        statusElement.innerHTML = '<span class="badge bg-danger">Failed</span>';
+                    } else if (data.job_status === 'failed' || data.job_status === 'aborted') {
+                        const label = data.job_status === 'failed' ? 'Failed' : 'Aborted';
+                        statusElement.innerHTML = `<span class="badge bg-danger">${label}</span>`;
                         statusIcon.className = 'status-icon status-failed';
                         clearInterval(statusCheckInterval);
                         // Show error if available
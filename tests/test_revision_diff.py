@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from config import load_config
+from anomaly_detector import detect_anomalies
+from revision_diff import ContextFinder, reanalyze_revision
+
+WORDS = "the party shall pay amount due term agreement notice within days of this contract".split()
+
+def _config():
+    config = load_config()
+    config['VLLM_ENABLED'] = False
+    config['DISABLED_DETECTORS'] = ['ai']
+    config['DETECTOR_CPU_WORKERS'] = 1
+    # Let every revision be re-analyzed rather than fall back to a full run
+    config['REVISION_MAX_CHANGED_FRACTION'] = 1.0
+    return config
+
+def _date(rng):
+    day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(2018, 2026)
+    return rng.choice([f"{month:02d}/{day:02d}/{year}", f"{year}-{month:02d}-{day:02d}"])
+
+def _clause(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(3, 12))]
+    kind = rng.random()
+    if kind < 0.2:
+        words += ["start date", _date(rng), "and end date", _date(rng)]
+    elif kind < 0.35:
+        words += ["invoice date", _date(rng), "payment due", _date(rng)]
+    elif kind < 0.55:
+        words += ["payment of", f"${rng.choice([5, 50, 500, 5000, 50000]):,}.00", "on", _date(rng)]
+    elif kind < 0.7:
+        words += [str(rng.choice([1, 10, 100, 1000, 10000])), "units"]
+    return " ".join(words).capitalize() + "."
+
+def _edit(text, rng):
+    """Return text with a few random insertions, deletions and replacements."""
+    for _ in range(rng.randint(1, 4)):
+        at = rng.randrange(len(text))
+        action = rng.choice(['insert', 'delete', 'replace', 'characters'])
+        if action == 'insert':
+            text = text[:at] + " " + _clause(rng) + " " + text[at:]
+        elif action == 'delete':
+            text = text[:at] + text[at + rng.randint(1, 300):]
+        elif action == 'replace':
+            text = text[:at] + _clause(rng) + text[at + rng.randint(1, 200):]
+        else:
+            text = text[:at] + rng.choice(["1", "0", "/", "-", " ", ". "]) + text[at + 1:]
+    return text
+
+def _key(anomaly):
+    return (anomaly['detector'], anomaly['type'], anomaly['start_position'], anomaly['end_position'],
+            anomaly['description'], anomaly['context'])
+
+@pytest.mark.parametrize('seed', range(20))
+def test_revision_matches_full_run(seed):
+    config = _config()
+    rng = random.Random(seed)
+    old_text = " ".join(_clause(rng) for _ in range(400))
+    new_text = _edit(old_text, rng)
+    old_anomalies = detect_anomalies(old_text, config)
+
+    stats = {}
+    revision = reanalyze_revision(old_text, old_anomalies, new_text, config, stats)
+    full = detect_anomalies(new_text, config)
+
+    assert revision is not None
+    assert sorted(map(_key, revision)) == sorted(map(_key, full))
+    assert stats['reanalyzed_chars'] < len(new_text)
+
+def test_unchanged_revision_reuses_every_anomaly():
+    config = _config()
+    rng = random.Random(0)
+    text = " ".join(_clause(rng) for _ in range(200))
+    anomalies = detect_anomalies(text, config)
+
+    stats = {}
+    revision = reanalyze_revision(text, anomalies, text, config, stats)
+
+    local = [anomaly for anomaly in anomalies if anomaly['detector'] != 'combined']
+    assert stats['reused_anomalies'] == len(local)
+    assert sorted(map(_key, revision)) == sorted(map(_key, anomalies))
+
+def test_context_finder_tolerates_model_quoting():
+    text = "Preamble. The Supplier  shall\npay the \u201cFees\u201d of $5,000.00 within thirty (30) days of the Invoice Date."
+    finder = ContextFinder(text)
+
+    start, end = finder.find('...the supplier shall pay the "fees" of...')
+    assert text[start:end].startswith("The Supplier")
+    start, end = finder.find("shall pay the Fees of $5,000.00 within 30 days of the invoice date")
+    assert "within thirty (30) days" in text[start:end]
+    assert finder.find("nothing like this appears anywhere in it") is None
+
+def test_positionless_anomalies_are_placed_by_context():
+    config = _config()
+    rng = random.Random(1)
+    clauses = [_clause(rng) for _ in range(300)]
+    old_text = " ".join(clauses)
+    new_text = " ".join(clauses[:250] + [_clause(rng)] + clauses[251:])
+    quoted = {'type': 'number', 'severity': 'low', 'description': 'Quoted', 'detector': 'ai',
+              'context': "  " + "\n".join(clauses[10].upper().split()) + "  "}
+    lost = dict(quoted, description='Lost', context="words the text never had in any of its clauses")
+
+    stats = {}
+    revision = reanalyze_revision(old_text, [quoted], new_text, config, stats)
+    assert [anomaly['description'] for anomaly in revision if anomaly['detector'] == 'ai'] == ['Quoted']
+    assert stats['whole_text_fallbacks'] == 0
+
+    # Any anomaly that cannot be placed sends its detector over the whole text
+    stats = {}
+    reanalyze_revision(old_text, [quoted, lost], new_text, config, stats)
+    assert stats['unplaced_anomalies'] == 1
+    assert stats['whole_text_fallbacks'] == 1
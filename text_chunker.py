@@ -0,0 +1,128 @@
+import re
+
+# Clauses end after sentence or clause punctuation followed by whitespace, or at line breaks
+CLAUSE_BOUNDARY_PATTERN = re.compile(r'(?<=[.;:!?])\s+|\n\s*')
+
+# Pieces counted by the token estimate: single digits, runs of letters and
+# single punctuation characters
+TOKEN_PIECE_PATTERN = re.compile(r'\d|[^\W\d_]+|[^\w\s]')
+
+# Average characters per token for runs of letters. SentencePiece tokenizers
+# such as Mistral's encode common English words as one piece and longer or
+# rarer words as several, split every digit, and give most punctuation its
+# own token; counting four letters per token approximates that without
+# shipping the tokenizer, erring towards more tokens for common words.
+CHARS_PER_WORD_TOKEN = 4
+
+# Pieces of an over-long clause, split at whitespace
+WORD_PATTERN = re.compile(r'\S+\s*')
+
+def estimate_tokens(text):
+    """
+    Estimate how many model tokens a text takes.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    tokens = 0
+    for piece in TOKEN_PIECE_PATTERN.finditer(text):
+        length = piece.end() - piece.start()
+        tokens += (length + CHARS_PER_WORD_TOKEN - 1) // CHARS_PER_WORD_TOKEN
+    return tokens
+
+def chunk_text(text, max_tokens, overlap_tokens=0):
+    """
+    Split text into chunks of at most max_tokens on clause boundaries.
+
+    Clauses are packed greedily into each chunk. A clause longer than the
+    budget is split between words. Each chunk after the first starts with
+    the last clauses of the previous chunk, up to overlap_tokens, so that
+    text near a boundary is seen with its surroundings at least once.
+
+    Args:
+        text (str): Text to split
+        max_tokens (int): Token budget of a chunk
+        overlap_tokens (int): Tokens of the previous chunk repeated at the
+            start of the next one
+
+    Returns:
+        list: Chunk dictionaries with text, start_offset and end_offset,
+            in text order
+    """
+    units = _clause_units(text, max_tokens)
+
+    chunks = []
+    first = 0
+    while first < len(units):
+        tokens = 0
+        last = first
+        while last < len(units) and (last == first or tokens + units[last][2] <= max_tokens):
+            tokens += units[last][2]
+            last += 1
+
+        start_offset, end_offset = units[first][0], units[last - 1][1]
+        chunks.append({
+            'text': text[start_offset:end_offset],
+            'start_offset': start_offset,
+            'end_offset': end_offset
+        })
+        if last >= len(units):
+            break
+
+        # Step back over trailing clauses for the overlap, leaving room for the
+        # next new clause so that every chunk moves forward
+        overlap_budget = min(overlap_tokens, max_tokens - units[last][2])
+        next_first = last
+        overlap = 0
+        while next_first - 1 > first and overlap + units[next_first - 1][2] <= overlap_budget:
+            next_first -= 1
+            overlap += units[next_first][2]
+        first = next_first
+
+    return chunks
+
+def _clause_units(text, max_tokens):
+    """Return (start, end, tokens) for each clause, splitting clauses over the budget."""
+    units = []
+    start = 0
+    for boundary in CLAUSE_BOUNDARY_PATTERN.finditer(text):
+        end = boundary.end()
+        if end > start:
+            _add_unit(units, text, start, end, max_tokens)
+        start = end
+    if start < len(text):
+        _add_unit(units, text, start, len(text), max_tokens)
+    return units
+
+def _add_unit(units, text, start, end, max_tokens):
+    """Append a clause, split between words (or characters) if it is over the budget."""
+    tokens = estimate_tokens(text[start:end])
+    if tokens <= max_tokens:
+        units.append((start, end, tokens))
+        return
+
+    piece_start = start
+    piece_tokens = 0
+    for word in WORD_PATTERN.finditer(text, start, end):
+        word_tokens = estimate_tokens(word.group())
+        if word_tokens > max_tokens:
+            # A single huge "word" is cut into pieces of max_tokens characters,
+            # since no character counts as more than one token
+            if word.start() > piece_start:
+                units.append((piece_start, word.start(), piece_tokens))
+            for cut in range(word.start(), word.end(), max_tokens):
+                cut_end = min(cut + max_tokens, word.end())
+                units.append((cut, cut_end, estimate_tokens(text[cut:cut_end])))
+            piece_start = word.end()
+            piece_tokens = 0
+            continue
+        if piece_tokens + word_tokens > max_tokens and word.start() > piece_start:
+            units.append((piece_start, word.start(), piece_tokens))
+            piece_start = word.start()
+            piece_tokens = 0
+        piece_tokens += word_tokens
+    if end > piece_start:
+        units.append((piece_start, end, piece_tokens))
@@ -0,0 +1,130 @@
+import re
+import bisect
+from array import array
+
+# Whitespace runs collapse to a single space; anything else outside the
+# allowed word characters and punctuation is dropped
+NOISE_PATTERN = re.compile(r'(\s+)|[^\w\s.,;:!?$%&()-+=\'"\/\\]+')
+
+class OffsetMap:
+    """
+    Map positions in normalized text back to positions in the raw text.
+
+    Only the points where the distance between normalized and raw positions
+    changes are stored, in two parallel integer arrays, so text that needed
+    little cleaning produces an almost empty map.
+    """
+    __slots__ = ('clean_starts', 'raw_starts')
+
+    def __init__(self, clean_starts=(), raw_starts=()):
+        self.clean_starts = array('q', clean_starts)
+        self.raw_starts = array('q', raw_starts)
+
+    def add(self, clean_pos, raw_pos):
+        """Record that clean_pos onwards continues linearly from raw_pos."""
+        if self.clean_starts and self.clean_starts[-1] == clean_pos:
+            self.raw_starts[-1] = raw_pos
+        elif not self.raw_starts or raw_pos - clean_pos != self.raw_starts[-1] - self.clean_starts[-1]:
+            self.clean_starts.append(clean_pos)
+            self.raw_starts.append(raw_pos)
+
+    def to_source(self, position):
+        """
+        Translate a normalized text position to a raw text position.
+
+        Args:
+            position (int): Character position in the normalized text
+
+        Returns:
+            int: Corresponding character position in the raw text
+        """
+        index = bisect.bisect_right(self.clean_starts, position) - 1
+        if index < 0:
+            return position
+        return self.raw_starts[index] + (position - self.clean_starts[index])
+
+    def to_source_span(self, start, end):
+        """
+        Translate a normalized [start, end) span to the raw text.
+
+        Args:
+            start (int): Start position in the normalized text
+            end (int): End position in the normalized text (exclusive)
+
+        Returns:
+            tuple: (raw_start, raw_end)
+        """
+        if end <= start:
+            raw_start = self.to_source(start)
+            return raw_start, raw_start
+        return self.to_source(start), self.to_source(end - 1) + 1
+
+    def shifted(self, delta):
+        """Return a copy of the map with raw positions moved by delta."""
+        return OffsetMap(self.clean_starts, (raw_start + delta for raw_start in self.raw_starts))
+
+    def to_list(self):
+        """Return a JSON-serializable form of the map."""
+        return [self.clean_starts.tolist(), self.raw_starts.tolist()]
+
+    @classmethod
+    def from_list(cls, data):
+        """Rebuild a map produced by to_list."""
+        return cls(data[0], data[1])
+
+    def __len__(self):
+        return len(self.clean_starts)
+
+def normalize_text(text):
+    """
+    Clean and normalize extracted text in a single pass.
+
+    Whitespace runs become a single space, unsupported characters are
+    removed and the result is stripped, while recording where every
+    character of the result came from in the input.
+
+    Args:
+        text (str): Raw extracted text
+
+    Returns:
+        tuple: (normalized_text, offset_map)
+    """
+    offset_map = OffsetMap()
+    if not text:
+        return "", offset_map
+
+    pieces = []
+    clean_pos = 0
+    last = 0
+    for match in NOISE_PATTERN.finditer(text):
+        start, end = match.span()
+        if start > last:
+            offset_map.add(clean_pos, last)
+            pieces.append(text[last:start])
+            clean_pos += start - last
+        if match.group(1) is not None:
+            offset_map.add(clean_pos, start)
+            pieces.append(' ')
+            clean_pos += 1
+        last = end
+    if last < len(text):
+        offset_map.add(clean_pos, last)
+        pieces.append(text[last:])
+
+    normalized = "".join(pieces)
+    stripped = normalized.strip()
+    if not stripped:
+        return "", OffsetMap()
+    if len(stripped) == len(normalized):
+        return stripped, offset_map
+
+    # Re-base the map on the stripped text
+    leading = len(normalized) - len(normalized.lstrip())
+    stripped_map = OffsetMap()
+    stripped_map.add(0, offset_map.to_source(leading))
+    first = bisect.bisect_right(offset_map.clean_starts, leading)
+    for clean_start, raw_start in zip(offset_map.clean_starts[first:], offset_map.raw_starts[first:]):
+        if clean_start - leading >= len(stripped):
+            break
+        stripped_map.add(clean_start - leading, raw_start)
+    return stripped, stripped_map
@@ -1,11 +1,19 @@
 import logging
-import re
 from datetime import datetime, timedelta
 import os
 import json
+from pattern_scanner import TextMatch, build_scanner, parse_number
+from date_normalizer import parse_date
 
 logger = logging.getLogger(__name__)
 
+# Formats tried by validate_date when none are given, most common first
+DEFAULT_DATE_FORMATS = (
+    "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d",  # Slash formats
+    "%m-%d-%Y", "%d-%m-%Y", "%Y-%m-%d",  # Dash formats
+    "%B %d, %Y", "%d %B %Y",              # Month name formats
+)
+
 def validate_date(date_str, formats=None):
     """
     Validate if a date string is valid and reasonable.
@@ -18,29 +26,14 @@ def validate_date(date_str, formats=None):
         tuple: (is_valid, parsed_date, format_used)
     """
     if formats is None:
-        formats = [
-            "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d",  # Slash formats
-            "%m-%d-%Y", "%d-%m-%Y", "%Y-%m-%d",  # Dash formats
-            "%B %d, %Y", "%d %B %Y",              # Month name formats
-        ]
+        formats = DEFAULT_DATE_FORMATS
     
-    # Clean the date string
+    # Try each format; parse_date caches its results
     date_str = date_str.strip()
-    
-    # Try each format
     for fmt in formats:
-        try:
-            parsed_date = datetime.strptime(date_str, fmt)
-            
-            # Check if date is reasonable (not in distant past or future)
-            current_year = datetime.now().year
-            if parsed_date.year < current_year - 100 or parsed_date.year > current_year + 50:
-                continue
-                
+        parsed_date = parse_date(date_str, fmt)
+        if parsed_date is not None:
             return True, parsed_date, fmt
-        
-        except ValueError:
-            continue
     
     return False, None, None
 
@@ -68,26 +61,12 @@ def extract_dates_from_text(text, patterns=None):
             r'\b\d{1,2}\s+(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{4}\b',  # DD Month YYYY
         ]
     
-    dates = []
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            date_str = match.group(0)
-            start_pos = match.start()
-            end_pos = match.end()
-            
-            # Get context (text before and after)
-            context_start = max(0, start_pos - 50)
-            context_end = min(len(text), end_pos + 50)
-            context = text[context_start:context_end]
-            
-            dates.append({
-                'date_str': date_str,
-                'start_position': start_pos,
-                'end_position': end_pos,
-                'context': context
-            })
+    # Overlapping matches (e.g. the same date found by two patterns) are
+    # resolved to the most specific one
+    dates = [
+        TextMatch(text, start_pos, end_pos, 'date').to_dict()
+        for start_pos, end_pos, _, _ in build_scanner(tuple(patterns), ()).scan(text)
+    ]
     
     return dates
 
@@ -115,32 +94,12 @@ def extract_numbers_from_text(text, patterns=None):
     
     numbers = []
     
-    for pattern in patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            num_str = match.group(0)
-            start_pos = match.start()
-            end_pos = match.end()
-            
-            # Clean the number for conversion
-            clean_num = re.sub(r'[^\d.]', '', num_str)
-            try:
-                num_value = float(clean_num) if clean_num else None
-            except ValueError:
-                num_value = None
-            
-            # Get context (text before and after)
-            context_start = max(0, start_pos - 50)
-            context_end = min(len(text), end_pos + 50)
-            context = text[context_start:context_end]
-            
-            numbers.append({
-                'num_str': num_str,
-                'num_value': num_value,
-                'start_position': start_pos,
-                'end_position': end_pos,
-                'context': context
-            })
+    # Overlapping matches (e.g. the digits of a currency amount also matching
+    # as a plain number) are resolved to the most specific one
+    for start_pos, end_pos, _, _ in build_scanner((), tuple(patterns)).scan(text):
+        match = TextMatch(text, start_pos, end_pos, 'number')
+        match.num_value = parse_number(match.text)
+        numbers.append(match.to_dict())
     
     return numbers
 
@@ -291,6 +250,7 @@ def prepare_anomaly_report(document, anomalies, text_content=None):
             'context': anomaly.context,
             'start_position': anomaly.start_position,
             'end_position': anomaly.end_position,
+            'page_number': anomaly.page_number,
             'detected_at': anomaly.detected_at.strftime('%Y-%m-%d %H:%M:%S') if anomaly.detected_at else 'Unknown'
         })
     